@@ -0,0 +1,210 @@
+# asgi.py
+#
+# ASGI serving mode for many slow field devices at once:
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+#
+# Sockets live on the event loop and the Flask app runs on a bounded
+# thread pool (TOTO_ASGI_THREADS), so a slow client costs a coroutine,
+# not a thread. Request bodies are read on the loop before the app is
+# called. Responses up to ASGI_BUFFER_BYTES are built on the pool and
+# written by the loop; larger or streamed ones (exports) are forwarded
+# chunk by chunk and keep their pool thread until done, disconnected, or
+# stalled for ASGI_SEND_TIMEOUT seconds (the client then gets a truncated
+# body). Large exports are better fetched through /api/export/jobs.
+import asyncio
+import concurrent.futures
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import website
+
+ASGI_THREADS = int(os.environ.get("TOTO_ASGI_THREADS") or 8)
+ASGI_MAX_BODY = int(os.environ.get("TOTO_ASGI_MAX_BODY") or 64 * 1024 * 1024)
+ASGI_BUFFER_BYTES = 1024 * 1024
+ASGI_SEND_TIMEOUT = float(os.environ.get("TOTO_ASGI_SEND_TIMEOUT") or 30)
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="toto-asgi")
+
+
+class Disconnected(Exception):
+    pass
+
+
+def wsgi_environ(scope, body: bytes) -> dict:
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def _start_message(status: str, headers: list) -> dict:
+    return {
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+
+def run_wsgi(environ, loop, send, disconnected):
+    # Runs on the pool. Returns (start message, body) for the loop to send,
+    # or None once a large response has been streamed from here.
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response:
+            raise exc_info[1].with_traceback(exc_info[2])
+        response[:] = [status, headers]
+
+    def forward(message):
+        if disconnected.is_set():
+            raise Disconnected()
+        future = asyncio.run_coroutine_threadsafe(send(message), loop)
+        try:
+            future.result(timeout=ASGI_SEND_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise Disconnected()
+
+    result = website.app(environ, start_response)
+    try:
+        chunks, size = [], 0
+        it = iter(result)
+        for chunk in it:
+            if not chunk:
+                continue
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > ASGI_BUFFER_BYTES:
+                forward(_start_message(*response))
+                forward({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                for chunk in it:
+                    if chunk:
+                        forward({"type": "http.response.body", "body": chunk, "more_body": True})
+                forward({"type": "http.response.body", "body": b""})
+                return None
+        return _start_message(*response), b"".join(chunks)
+    except Disconnected:
+        return None
+    finally:
+        close = getattr(result, "close", None)
+        if close:
+            close()
+
+
+async def read_body(receive) -> bytes:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise Disconnected()
+        body += message.get("body", b"")
+        if len(body) > ASGI_MAX_BODY:
+            raise ValueError("request body too large")
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def watch_disconnect(receive, disconnected: threading.Event):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+async def http(scope, receive, send):
+    try:
+        body = await read_body(receive)
+    except Disconnected:
+        return
+    except ValueError:
+        await send(_start_message("413 Payload Too Large", [("Content-Type", "text/plain")]))
+        await send({"type": "http.response.body", "body": b"Request body too large."})
+        return
+
+    loop = asyncio.get_running_loop()
+    disconnected = threading.Event()
+    watcher = loop.create_task(watch_disconnect(receive, disconnected))
+    try:
+        buffered = await loop.run_in_executor(
+            _executor, run_wsgi, wsgi_environ(scope, body), loop, send, disconnected
+        )
+        if buffered is not None:
+            start, content = buffered
+            await send(start)
+            await send({"type": "http.response.body", "body": content})
+    finally:
+        watcher.cancel()
+
+
+def _startup():
+    website.init_db()
+    website.notify_jobs()
+
+
+async def lifespan(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await loop.run_in_executor(_executor, _startup)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http":
+        await http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    else:
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']!r}")
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("ASGI mode needs an ASGI server (pip install uvicorn); `python website.py` serves WSGI.")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
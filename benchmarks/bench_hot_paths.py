@@ -0,0 +1,151 @@
+# benchmarks/bench_hot_paths.py
+#
+# Times the request hot paths against generated databases of increasing
+# size and writes one JSON document, so runs from different versions can be
+# diffed. Databases are generated once per size and seed and reused
+# (benchmarks/.data/ by default).
+#
+#   python benchmarks/bench_hot_paths.py --sizes 10000,100000,1000000 --out bench.json
+#
+# Each timing reports the median and p95 of per-call wall time in ms.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from flask import render_template
+
+import website
+from bench_render import page_context
+from generate_data import AGE_GROUPS, generate, random_answers
+
+
+def timed(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "calls": repeat,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def database_for(size, data_dir, seed):
+    path = os.path.join(data_dir, f"toto-{size}-s{seed}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        generate(path + ".tmp", max(1, size // 10), size, seed=seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def bench_size(path, repeat, seed):
+    website.DB_PATH = path
+    website.init_db()
+    client = website.app.test_client()
+    conn = website.connect(path)
+    top_assessor = conn.execute(
+        "SELECT assessor FROM analytics_rollup WHERE assessor != '' GROUP BY assessor ORDER BY SUM(n) DESC LIMIT 1"
+    ).fetchone()[0]
+    patient_id = conn.execute("SELECT MAX(id) FROM patients").fetchone()[0]
+
+    rng = random.Random(seed)
+    answers = [random_answers(rng, rng.choice(AGE_GROUPS)) for _ in range(1000)]
+    it = iter(answers * (repeat * 10 // len(answers) + 1))
+
+    out = {}
+    out["compute_result"] = timed(lambda: website.compute_result(next(it), "en"), repeat * 10)
+    out["compute_results_batch_1000"] = timed(lambda: website.compute_results_batch(answers, "en"), max(3, repeat // 10))
+    parsed = [website.parse_answers(a) for a in answers]
+    out["score_batch_1000"] = timed(lambda: website.score_batch(parsed), max(3, repeat // 10))
+
+    for ar in ("7", "30", "all"):
+        for aa in ("", top_assessor):
+            key = f"compute_analytics[ar={ar},aa={'top' if aa else ''}]"
+            out[key] = timed(lambda: website.compute_analytics(conn, ar, aa, "en"), repeat)
+
+    cold = website.invalidate_analytics_cache
+    out["GET / (analytics cache cold)"] = timed(lambda: client.get("/"), repeat, setup=cold)
+    out["GET / (analytics cache warm)"] = timed(lambda: client.get("/"), repeat)
+    out["GET /?ar=all (cold)"] = timed(lambda: client.get("/?ar=all"), repeat, setup=cold)
+    out["GET /?patient_id (cold)"] = timed(lambda: client.get(f"/?patient_id={patient_id}"), repeat, setup=cold)
+    etag = client.get("/").headers.get("ETag")
+    out["GET / (If-None-Match, 304)"] = timed(lambda: client.get("/", headers={"If-None-Match": etag}), repeat)
+
+    form = dict(answers[0], lang="en", ar="30", aa="")
+    out["POST /screenings"] = timed(lambda: client.post(f"/screenings?patient_id={patient_id}", data=form), repeat)
+
+    with website.app.test_request_context("/"):
+        ctx = page_context()
+        out["render_template"] = timed(lambda: render_template(website.PAGE_TEMPLATE, **ctx), repeat)
+
+    conn.close()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated screening counts")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(HERE, ".data"))
+    parser.add_argument("--out", default="-", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        path = database_for(size, args.data_dir, args.seed)
+        # benchmark a copy: the POST timings add rows
+        work = path + ".run"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+        src = sqlite3.connect(path)
+        dst = sqlite3.connect(work)
+        src.backup(dst)
+        src.close()
+        dst.close()
+        report["sizes"][str(size)] = bench_size(work, args.repeat, args.seed)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
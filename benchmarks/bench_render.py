@@ -0,0 +1,82 @@
+# benchmarks/bench_render.py
+#
+# Per-request page render time: compiling the page source on every call
+# (the old render_template_string path) vs. the cached loader template.
+#
+#   python benchmarks/bench_render.py [--repeat 200]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, render_template_string
+
+import website
+
+
+def page_context(lang="en"):
+    answers = {"age_group": "2_12m", "fever": "Yes", "cough_breath": "Yes", "rr": "55", "assessor": "Fatima"}
+    patients = [
+        {"id": i, "name": f"Child {i}", "village": "Kibera", "age_group": "1_5y", "age_group_label": "1–5 years"}
+        for i in range(50, 0, -1)
+    ]
+    analytics = {
+        "total": 120,
+        "risk_counts": {"High": 30, "Medium": 40, "Low": 50},
+        "top_conditions": [("Pneumonia", 60, 50), ("Malaria", 40, 33), ("Malnutrition", 20, 17)],
+        "danger_signs": [("Convulsions", 4), ("Vomits everything", 2)],
+        "assessor_stats": [],
+    }
+    return dict(
+        t=website.make_t(lang),
+        lang=lang,
+        lang_choices=website.LANG_CHOICES,
+        result=website.compute_result(answers, lang=lang),
+        form=answers,
+        message=None,
+        patients=patients,
+        selected_patient=patients[0],
+        history=[],
+        default_age_group="1_5y",
+        analytics=analytics,
+        assessor_names=["Fatima", "Juma"],
+        ar="30",
+        aa="",
+    )
+
+
+def time_per_call(fn, repeat):
+    fn()  # warm-up: first loader render compiles and caches the template
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    template_path = os.path.join(website.app.root_path, website.app.template_folder, website.PAGE_TEMPLATE)
+    with open(template_path, encoding="utf-8") as f:
+        source = f.read()
+
+    with website.app.test_request_context("/"):
+        ctx = page_context()
+        before = time_per_call(lambda: render_template_string(source, **ctx), args.repeat)
+        after = time_per_call(lambda: render_template(website.PAGE_TEMPLATE, **ctx), args.repeat)
+
+    print(json.dumps({
+        "repeat": args.repeat,
+        "render_template_string_ms": round(before, 3),
+        "cached_template_ms": round(after, 3),
+        "speedup": round(before / after, 1) if after else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
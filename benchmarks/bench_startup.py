@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start cost: `import website` in a fresh interpreter, broken down
+# with `python -X importtime`, plus the wall time to import and serve the
+# first GET / against an empty database.
+#
+#   python benchmarks/bench_startup.py [--repeat 10] [--top 15]
+#
+# Times are the median over --repeat fresh processes, in ms.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = "import website; website.init_db(); website.app.test_client().get('/')"
+
+
+def run(code, env, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return (time.perf_counter() - start) * 1000.0, proc.stderr
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package"; nested imports
+    # are indented two spaces per level and printed before their parent.
+    # Returns (cumulative us of every module, cumulative us of website's
+    # direct imports).
+    modules, children, direct = {}, {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name = name.strip()
+        modules[name] = int(cumulative_us)
+        if depth == 1:
+            children[name] = int(cumulative_us)
+        elif depth == 0:
+            if name == "website":
+                direct = children
+            children = {}
+    return modules, direct
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="slowest direct imports of website to list")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, TOTO_DB_PATH=os.path.join(tmp, "startup.db"))
+    run("import website", env)  # warm the bytecode and OS file caches
+
+    imports, breakdowns = [], []
+    for _ in range(args.repeat):
+        _, stderr = run("import website", env, importtime=True)
+        modules, direct = parse_importtime(stderr)
+        imports.append(modules["website"] / 1000.0)
+        breakdowns.append((modules, direct))
+
+    wall_import = [run("import website", env)[0] for _ in range(args.repeat)]
+    wall_first = [run(FIRST_REQUEST, env)[0] for _ in range(args.repeat)]
+
+    per_module = {}
+    for _, direct in breakdowns:
+        for name, cumulative in direct.items():
+            per_module.setdefault(name, []).append(cumulative / 1000.0)
+    slowest = sorted(((name, statistics.median(v)) for name, v in per_module.items()), key=lambda item: -item[1])[:args.top]
+
+    print(json.dumps({
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "import_website_ms": round(statistics.median(imports), 1),
+        "wall_import_ms": round(statistics.median(wall_import), 1),
+        "wall_first_request_ms": round(statistics.median(wall_first), 1),
+        "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+        "pyarrow_loaded_at_import": "pyarrow" in breakdowns[0][0],
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/generate_data.py
+#
+# Fills a database with synthetic patients and screenings: answers drawn
+# from plausible field distributions, a pool of assessors, and timestamps
+# spread over the last --days days. The same --seed gives the same data.
+#
+#   python benchmarks/generate_data.py --db bench.db --patients 10000 --screenings 100000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import website
+
+FIRST_NAMES = [
+    "Amina", "Baraka", "Neema", "Juma", "Zawadi", "Imani", "Wanjiru", "Otieno", "Achieng", "Kamau",
+    "Aarav", "Priya", "Ananya", "Rohan", "Saanvi", "Ishaan", "Fatima", "Ali", "Zainab", "Hassan",
+    "आरव", "अनन्या", "Mwajuma", "Pendo", "Rehema", "Tumaini", "Subira", "Faraji", "Kito", "Asha",
+]
+VILLAGES = [
+    "Kibera", "Mathare", "Kisumu Ndogo", "Mombasa Road", "Kawangware", "Githurai", "Dharavi",
+    "Rampur", "Sitapur", "Barabanki", "Nyalenda", "Manyatta", "Bondeni", "Majengo", "Kariobangi",
+]
+ASSESSORS = [
+    "Fatima", "Juma", "Neema", "Grace", "Peter", "Mary", "Joseph", "Esther", "Daniel", "Ruth",
+    "Sunita", "Ramesh", "Kavita", "Anil", "Lakshmi", "Suresh", "Halima", "Musa", "Rose", "John",
+    "Agnes", "Samuel", "Mercy", "David", "Zuhura",
+]
+AGE_GROUPS = (["0_2m"] * 10) + (["2_12m"] * 30) + (["1_5y"] * 60)
+RR_MEAN = {"0_2m": 50, "2_12m": 42, "1_5y": 32}
+
+
+def yes(rng, p):
+    return "Yes" if rng.random() < p else "No"
+
+
+def random_answers(rng, age_group):
+    fever = yes(rng, 0.45)
+    cough = yes(rng, 0.35)
+    a = {
+        "age_group": age_group,
+        "assessor": "" if rng.random() < 0.03 else rng.choice(ASSESSORS),
+        "ds_drink": yes(rng, 0.03),
+        "ds_vomit": yes(rng, 0.04),
+        "ds_convulsions": yes(rng, 0.02),
+        "ds_lethargy": yes(rng, 0.02),
+        "fever": fever,
+        "cough_breath": cough,
+        "chest_indrawing": yes(rng, 0.15 if cough == "Yes" else 0.01),
+        "stridor": yes(rng, 0.05 if cough == "Yes" else 0.005),
+        "oedema": yes(rng, 0.02),
+    }
+    if cough == "Yes" or rng.random() < 0.4:
+        a["rr"] = str(max(10, int(rng.gauss(RR_MEAN[age_group] + (8 if cough == "Yes" else 0), 10))))
+    if age_group == "0_2m":
+        a["not_feeding"] = yes(rng, 0.08)
+        a["stim_only"] = yes(rng, 0.08)
+        a["muac"] = "not_measured"
+    else:
+        a["muac"] = rng.choices(["green", "yellow", "red", "not_measured"], [70, 10, 5, 15])[0]
+    if fever == "Yes":
+        a["rdt"] = rng.choices(["positive", "negative", "not_done"], [35, 50, 15])[0]
+    else:
+        a["rdt"] = rng.choices(["negative", "not_done"], [10, 90])[0]
+    if rng.random() < 0.3:
+        a["wa_caregiver"] = "2547%08d" % rng.randrange(10 ** 8)
+        a["include_name"] = yes(rng, 0.5)
+    return a
+
+
+def timestamps(rng, n, days, end):
+    start = end - timedelta(days=days)
+    span = int((end - start).total_seconds() // 60)
+    return [(start + timedelta(minutes=m)).strftime("%Y-%m-%d %H:%M") for m in sorted(rng.randrange(span) for _ in range(n))]
+
+
+def generate(db_path, patients, screenings, days=365, seed=1, chunk=20000, lang="en"):
+    rng = random.Random(seed)
+    end = datetime.now()
+    conn = website.connect(db_path)
+    website.migrate(conn)
+
+    patient_rows = [
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES)}", rng.choice(VILLAGES), rng.choice(AGE_GROUPS), ts)
+        for ts in timestamps(rng, patients, days, end)
+    ]
+    conn.execute("BEGIN IMMEDIATE")
+    first_pid = conn.execute("SELECT COALESCE(MAX(id), 0) FROM patients").fetchone()[0] + 1
+    conn.executemany("INSERT INTO patients (name, village, age_group, created_at) VALUES (?,?,?,?)", patient_rows)
+    conn.commit()
+
+    created = timestamps(rng, screenings, days, end)
+    for lo in range(0, screenings, chunk):
+        answers, selected, pids = [], [], []
+        for _ in created[lo:lo + chunk]:
+            if patients and rng.random() < 0.7:
+                idx = rng.randrange(patients)
+                name, village, age_group, _ = patient_rows[idx]
+                selected.append({"id": first_pid + idx, "name": name, "village": village, "age_group": age_group})
+                pids.append(first_pid + idx)
+            else:
+                age_group = rng.choice(AGE_GROUPS)
+                selected.append(None)
+                pids.append(None)
+            answers.append(random_answers(rng, selected[-1]["age_group"] if selected[-1] else age_group))
+        results = website.compute_results_batch(answers, lang, selected)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            website.SCREENING_INSERT_SQL,
+            [website.screening_row(pid, ts, r) for pid, ts, r in zip(pids, created[lo:lo + chunk], results)],
+        )
+        conn.commit()
+
+    # fold everything into the rollup and treat the data as already synced
+    conn.execute("BEGIN IMMEDIATE")
+    website.fold_rollup(conn)
+    conn.commit()
+    top = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_log").fetchone()[0]
+    website.mark_synced(conn, top)
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=website.DB_PATH)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--screenings", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="delete the database first")
+    args = parser.parse_args()
+
+    if args.reset:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    start = time.perf_counter()
+    generate(args.db, args.patients, args.screenings, args.days, args.seed)
+    print(json.dumps({
+        "db": args.db,
+        "patients": args.patients,
+        "screenings": args.screenings,
+        "seed": args.seed,
+        "seconds": round(time.perf_counter() - start, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import website
+
+ASSESSORS = ["Asha", "Ravi", ""]
+
+
+def random_answers(rng):
+    answers = {key: rng.choice(["Yes", "No"]) for key in (
+        "ds_drink", "ds_vomit", "ds_convulsions", "ds_lethargy", "fever", "cough_breath",
+        "chest_indrawing", "stridor", "oedema", "not_feeding", "stim_only",
+    )}
+    answers.update(
+        age_group=rng.choice(["0_2m", "2_12m", "1_5y"]),
+        rr=str(rng.randrange(20, 70)),
+        muac=rng.choice(["green", "yellow", "red", "not_measured"]),
+        rdt=rng.choice(["positive", "negative", "not_done"]),
+        assessor=rng.choice(ASSESSORS),
+    )
+    return answers
+
+
+@pytest.fixture
+def db(tmp_path):
+    # 400 screenings over the last 60 days, all folded into the rollup
+    path = str(tmp_path / "analytics.db")
+    conn = website.connect(path)
+    website.migrate(conn)
+    rng = random.Random(1)
+    now = datetime.now()
+    answers = [random_answers(rng) for _ in range(400)]
+    created = sorted((now - timedelta(minutes=rng.randrange(60 * 24 * 60))).strftime("%Y-%m-%d %H:%M") for _ in answers)
+    results = website.compute_results_batch(answers, "en")
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(website.SCREENING_INSERT_SQL, [website.screening_row(None, ts, r) for ts, r in zip(created, results)])
+    website.fold_rollup(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def full_scan(conn, aa):
+    where, params = ("TRIM(assessor) = ?", [aa]) if aa else ("true", [])
+    rows = conn.execute(website._ROLLUP_SELECT + f" WHERE {where} GROUP BY 1, 2, 3, 4", params)
+    return website.analytics_json(website.analytics_from_groups([tuple(r)[1:] for r in rows]))
+
+
+@pytest.mark.parametrize("aa", ["", "Asha"])
+def test_analytics_exact_while_rollup_folds(db, aa):
+    # Half the screenings are left in the tail, and a second connection folds
+    # them just as the tail query starts. The result must still match a
+    # full scan of screenings.
+    writer = website.connect(db)
+    reader = website.connect(db)
+    expected = full_scan(reader, aa)
+
+    half = writer.execute("SELECT MAX(id) FROM screenings").fetchone()[0] // 2
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("DELETE FROM analytics_rollup")
+    website._rollup_from_screenings(writer, "id <= ?", (half,))
+    writer.execute("UPDATE db_state SET rollup_hwm = ? WHERE id = 1", (half,))
+    writer.commit()
+
+    def fold_on_tail(sql):
+        if f"id > {website.ROLLUP_HWM_SQL}" in sql and not writer.in_transaction:
+            writer.execute("BEGIN IMMEDIATE")
+            website.fold_rollup(writer)
+            writer.commit()
+
+    reader.set_trace_callback(fold_on_tail)
+    got = website.analytics_json(website.compute_analytics(reader, "all", aa))
+    reader.set_trace_callback(None)
+    assert writer.execute(f"SELECT {website.ROLLUP_HWM_SQL}").fetchone()[0] > half
+    assert got == expected
+    reader.close()
+    writer.close()
+
+
+def test_analytics_cache_sees_fold_from_other_connection(db):
+    # A fold moves screenings from the tail into the rollup without touching
+    # the change counter; the cached result must still be revalidated.
+    website.invalidate_analytics_cache()
+    reader = website.connect(db)
+    writer = website.connect(db)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("DELETE FROM analytics_rollup")
+    writer.execute("UPDATE db_state SET rollup_hwm = 0 WHERE id = 1")
+    writer.commit()
+    before = website.cached_analytics(reader, ar="all", aa="", lang="en")
+
+    writer.execute("BEGIN IMMEDIATE")
+    website.fold_rollup(writer)
+    writer.commit()
+    after = website.cached_analytics(reader, ar="all", aa="", lang="en")
+    assert after is not before
+    assert website.analytics_json(after) == full_scan(reader, "")
+    reader.close()
+    writer.close()
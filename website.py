@@ -1,1447 +1,361 @@
 # website.py
-from flask import Flask, render_template_string, request, redirect, url_for
+import click
+from flask import Flask, g, has_request_context, jsonify, make_response, render_template, request, redirect, send_file, url_for
+import contextlib
+import csv
+import io
 import math
 import re
 import sqlite3
 import json
+import functools
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from urllib.parse import quote
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+# pyarrow is optional and slow to import, so it is loaded on first use
+# rather than at startup.
+
+@functools.lru_cache(maxsize=None)
+def arrow_modules():
+    # (pyarrow, pyarrow.compute, pyarrow.dataset, pyarrow.parquet)
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:  # Parquet export/analytics are unavailable without pyarrow
+        return None
+    return pyarrow, pyarrow.compute, pyarrow.dataset, pyarrow.parquet
 
 app = Flask(__name__)
-DB_PATH = "toto.db"
+DB_PATH = os.environ.get("TOTO_DB_PATH", "toto.db")
 
 # -------------------- i18n (local) --------------------
 
-TRANSLATIONS = {
-    "en": {
-        "app_title": "Toto Gemma — Under-5 Screening",
-        "app_subtitle": "Screening + coaching only. If any danger sign is present, refer urgently.",
-        "local_storage": "Local storage (SQLite)",
-        "language": "Language",
-        "translate": "Translate",
-        "english": "English",
-        "swahili": "Kiswahili",
-        "hindi": "हिंदी",
-
-        "add_patient_title": "Add patient (local only)",
-        "add_patient_hint": "Saves only on this device. Keep info minimal.",
-        "name_nickname": "Name / nickname",
-        "village_optional": "Village (optional)",
-        "default_age_group": "Default age group",
-        "add_patient_btn": "Add patient",
-
-        "patient_list": "Patient list",
-        "no_patients": "No patients yet.",
-        "select": "Select",
-        "delete": "Delete",
-        "select_hint": "Select a patient to save screening history under them (optional).",
-        "recent_screenings": "Recent screenings (last 5)",
-        "no_screenings": "No screenings for this patient yet.",
-
-        "screening_form": "Screening form",
-        "screening_hint": "Answer what applies. If you selected a patient on the right, screenings save under them.",
-        "current_patient": "Current patient: {name}{village}",
-        "age_group": "Age group",
-        "caregiver_wa": "Caregiver WhatsApp (optional)",
-        "supervisor_wa": "Supervisor WhatsApp (optional)",
-        "digits_only": "Digits only, include country code",
-        "assessor": "Assessor / CHW name (optional)",
-        "include_patient_name": "Include patient name in WhatsApp?",
-        "include_village": "Include village in WhatsApp?",
-        "only_used_if_patient": "Only used if a patient is selected.",
-        "no": "No",
-        "yes": "Yes",
-
-        "danger_signs": "Danger signs",
-        "danger_signs_hint": "If any are Yes, refer urgently.",
-        "ds_drink": "Not able to drink/breastfeed?",
-        "ds_vomit": "Vomits everything?",
-        "ds_convulsions": "Convulsions?",
-        "ds_lethargy": "Very sleepy/unconscious?",
-
-        "main_symptoms": "Main symptoms",
-        "fever": "Fever now or in last 2 days?",
-        "cough_breath": "Cough or difficult breathing?",
-        "rr": "Breaths per minute (optional)",
-        "rr_hint": "Tip: count breaths for 60 seconds while the child is calm.",
-        "chest_indrawing": "Chest indrawing?",
-        "stridor": "Stridor (noisy breathing when calm)?",
-
-        "nutrition": "Nutrition",
-        "muac": "MUAC color (6–59 months)",
-        "muac_not_measured": "Not measured",
-        "muac_green": "Green",
-        "muac_yellow": "Yellow",
-        "muac_red": "Red",
-        "oedema": "Swelling on both feet?",
-
-        "young_infant_title": "Young infant add-on (0–2 months)",
-        "young_infant_hint": "Only answer if the age group is 0–2 months.",
-        "not_feeding": "Not feeding well?",
-        "stim_only": "Moves only when stimulated?",
-
-        "malaria_test": "Malaria test (if available)",
-        "rdt_result": "RDT result",
-        "rdt_not_done": "Not done",
-        "rdt_negative": "Negative",
-        "rdt_positive": "Positive",
-
-        "get_result": "Get result",
-        "reset": "Reset",
-
-        "result_actions": "What to do now",
-        "result_tips": "Coaching tips",
-        "also_consider": "Also consider",
-
-        "share_title": "Share via WhatsApp",
-        "share_hint": "This does not auto-send. It opens WhatsApp with a pre-filled summary.",
-        "message_to_share": "Message to share",
-        "share_caregiver": "Share to caregiver",
-        "share_supervisor": "Share to supervisor",
-        "copy_summary": "Copy summary",
-
-        "analytics": "Analytics (local)",
-        "analytics_hint": "Quick admin stats from saved screenings.",
-        "time_range": "Time range",
-        "last_7": "Last 7 days",
-        "last_30": "Last 30 days",
-        "all_time": "All time",
-        "assessor_filter": "Assessor filter",
-        "all": "All",
-        "apply": "Apply",
-        "reset_filters": "Reset",
-        "total": "Total",
-        "high": "High",
-        "medium": "Medium",
-        "low": "Low",
-        "top_conditions": "Top conditions",
-        "common_danger_signs": "Common danger signs (from forms)",
-        "assessor_performance": "Assessor performance",
-
-        "quick_guidance": "Quick guidance",
-        "privacy": "Privacy",
-        "privacy_text": "Keep messages short and avoid sensitive identifiers. WhatsApp numbers are optional.",
-
-        "cond_pneumonia": "Pneumonia",
-        "cond_malaria": "Malaria",
-        "cond_malnutrition": "Malnutrition",
-        "cond_neonatal": "Neonatal complications",
-
-        "share_header": "Toto Gemma — Under-5 screening result",
-        "share_patient": "Patient: {name}",
-        "share_village": "Village: {village}",
-        "share_risk": "Risk: {risk}",
-        "share_most_likely": "Most likely: {cond} ({pct}%)",
-        "share_also": "Also consider: {alt}",
-        "share_next_steps": "Next steps:",
-        "share_danger_present": "Danger signs present: seek urgent care now.",
-
-        "act_refer_urgent": "Refer urgently to the nearest health facility now.",
-        "act_keep_warm_feed": "Keep the child warm and continue breastfeeding/feeding if able.",
-        "act_malaria_protocol": "If trained and stocked, follow local malaria protocol for confirmed malaria; otherwise refer.",
-        "act_sam_assess": "Ask for urgent nutrition program/clinical assessment (SAM).",
-        "act_follow_local": "Follow local protocol; arrange follow-up if symptoms continue or worsen.",
-        "act_pneumonia_same_day": "If breathing is fast for age or worsening, go to a facility the same day.",
-        "act_malaria_test": "If fever continues, get a malaria test if available and follow local treatment guidance.",
-        "act_muac_link": "Measure MUAC if not done; link to community nutrition services if available.",
-        "act_young_infant_prompt": "Young infants can deteriorate fast; seek facility assessment promptly.",
-
-        "tip_keep_warm": "Keep the child warm.",
-        "tip_feed_fluids": "Continue breastfeeding/feeding and offer fluids often.",
-        "tip_breathing_urgent": "If breathing becomes difficult, chest pulls in, or the child cannot drink—go urgently.",
-
-        "tip_fever_care": "Treat fever with locally recommended fever care and keep the child hydrated.",
-        "tip_get_rdt": "If you can, get a malaria rapid test as soon as possible.",
-        "tip_severe_malaria_urgent": "If the child becomes very sleepy, has convulsions, or cannot drink—go urgently.",
-
-        "tip_bf_continue": "Continue breastfeeding if the child is breastfeeding.",
-        "tip_small_meals": "Give small, frequent, energy-dense meals if the child can eat.",
-        "tip_safe_water": "Wash hands and use safe water to reduce infections that worsen nutrition.",
-
-        "tip_skin_to_skin": "Keep the baby warm (skin-to-skin if possible).",
-        "tip_bf_frequent": "Breastfeed frequently if the baby can feed.",
-        "tip_neonate_urgent": "If feeding is poor, fever/low temperature, or low movement—go urgently.",
-    },
-
-    "sw": {
-        "app_title": "Toto Gemma — Uchunguzi wa Chini ya Miaka 5",
-        "app_subtitle": "Ni kwa uchunguzi na ushauri tu. Dalili ya hatari ikiwapo, peleka haraka kituoni.",
-        "local_storage": "Hifadhi ya ndani (SQLite)",
-        "language": "Lugha",
-        "translate": "Tafsiri",
-        "english": "English",
-        "swahili": "Kiswahili",
-        "hindi": "हिंदी",
-
-        "add_patient_title": "Ongeza mtoto (hifadhi ya ndani)",
-        "add_patient_hint": "Inahifadhi kwenye kifaa hiki tu. Weka taarifa chache.",
-        "name_nickname": "Jina / jina la utani",
-        "village_optional": "Kijiji (si lazima)",
-        "default_age_group": "Kundi la umri (chaguo-msingi)",
-        "add_patient_btn": "Ongeza",
-
-        "patient_list": "Orodha ya watoto",
-        "no_patients": "Bado hakuna watoto.",
-        "select": "Chagua",
-        "delete": "Futa",
-        "select_hint": "Chagua mtoto ili kuhifadhi historia ya uchunguzi (si lazima).",
-        "recent_screenings": "Uchunguzi wa hivi karibuni (5)",
-        "no_screenings": "Bado hakuna uchunguzi kwa mtoto huyu.",
-
-        "screening_form": "Fomu ya uchunguzi",
-        "screening_hint": "Jibu kinachohusika. Ukichagua mtoto kulia, uchunguzi utaokolewa chini yake.",
-        "age_group": "Kundi la umri",
-        "caregiver_wa": "WhatsApp ya mlezi (si lazima)",
-        "supervisor_wa": "WhatsApp ya msimamizi (si lazima)",
-        "digits_only": "Nambari tu, pamoja na kodi ya nchi",
-        "assessor": "Jina la mhudumu/CHW (si lazima)",
-        "include_patient_name": "Ongeza jina la mtoto kwenye WhatsApp?",
-        "include_village": "Ongeza kijiji kwenye WhatsApp?",
-        "only_used_if_patient": "Hutumika tu kama umechagua mtoto.",
-        "no": "Hapana",
-        "yes": "Ndiyo",
-
-        "danger_signs": "Dalili za hatari",
-        "danger_signs_hint": "Ikiwa yoyote ni Ndiyo, peleka haraka.",
-        "ds_drink": "Hawezi kunywa/kunyonya?",
-        "ds_vomit": "Hutapika kila kitu?",
-        "ds_convulsions": "Degedege?",
-        "ds_lethargy": "Mchovu sana/amelala bila fahamu?",
-
-        "main_symptoms": "Dalili kuu",
-        "fever": "Homa sasa au siku 2 zilizopita?",
-        "cough_breath": "Kikohozi au kupumua kwa shida?",
-        "rr": "Pumzi kwa dakika (si lazima)",
-        "rr_hint": "Dokezo: hesabu pumzi kwa sekunde 60 mtoto akiwa mtulivu.",
-        "chest_indrawing": "Kifua kuvutika ndani?",
-        "stridor": "Sauti ya kupumua wakati mtulivu?",
-
-        "nutrition": "Lishe",
-        "muac": "Rangi ya MUAC (miezi 6–59)",
-        "muac_not_measured": "Haijapimwa",
-        "muac_green": "Kijani",
-        "muac_yellow": "Njano",
-        "muac_red": "Nyekundu",
-        "oedema": "Uvimbe miguu yote miwili?",
-
-        "young_infant_title": "Sehemu ya mtoto mchanga (miezi 0–2)",
-        "young_infant_hint": "Jibu tu kama umri ni miezi 0–2.",
-        "not_feeding": "Hanyonyi/halishi vizuri?",
-        "stim_only": "Husogea tu akichochewa?",
-
-        "malaria_test": "Kipimo cha malaria (kikipatikana)",
-        "rdt_result": "Matokeo ya RDT",
-        "rdt_not_done": "Hakijafanywa",
-        "rdt_negative": "Hasi",
-        "rdt_positive": "Chanya",
-
-        "get_result": "Pata matokeo",
-        "reset": "Weka upya",
-
-        "result_actions": "Hatua za sasa",
-        "result_tips": "Ushauri kwa mlezi",
-        "also_consider": "Pia zingatia",
-
-        "share_title": "Shiriki kwa WhatsApp",
-        "share_hint": "Haiwatumi moja kwa moja. Hufungua WhatsApp na ujumbe tayari.",
-        "message_to_share": "Ujumbe wa kushiriki",
-        "share_caregiver": "Shiriki kwa mlezi",
-        "share_supervisor": "Shiriki kwa msimamizi",
-        "copy_summary": "Nakili muhtasari",
-
-        "analytics": "Takwimu (ndani)",
-        "analytics_hint": "Muhtasari wa msimamizi kutoka uchunguzi uliohifadhiwa.",
-        "time_range": "Kipindi",
-        "last_7": "Siku 7",
-        "last_30": "Siku 30",
-        "all_time": "Muda wote",
-        "assessor_filter": "Kichujio cha mhudumu",
-        "all": "Zote",
-        "apply": "Tumia",
-        "reset_filters": "Weka upya",
-        "total": "Jumla",
-        "high": "Hatari kubwa",
-        "medium": "Hatari ya kati",
-        "low": "Hatari ndogo",
-        "top_conditions": "Magonjwa yanayoongoza",
-        "common_danger_signs": "Dalili za hatari (mara nyingi)",
-        "assessor_performance": "Utendaji wa mhudumu",
-
-        "quick_guidance": "Mwongozo wa haraka",
-        "privacy": "Faragha",
-        "privacy_text": "Weka ujumbe mfupi, epuka vitambulisho nyeti. Nambari za WhatsApp si lazima.",
-
-        "cond_pneumonia": "Nimonia",
-        "cond_malaria": "Malaria",
-        "cond_malnutrition": "Utapiamlo",
-        "cond_neonatal": "Matatizo ya mtoto mchanga",
-
-        "share_header": "Toto Gemma — Matokeo ya uchunguzi",
-        "share_patient": "Mtoto: {name}",
-        "share_village": "Kijiji: {village}",
-        "share_risk": "Hatari: {risk}",
-        "share_most_likely": "Inawezekana zaidi: {cond} ({pct}%)",
-        "share_also": "Pia zingatia: {alt}",
-        "share_next_steps": "Hatua:",
-        "share_danger_present": "Dalili za hatari zipo: peleka haraka.",
-
-        "act_refer_urgent": "Peleka haraka kituo cha afya sasa.",
-        "act_keep_warm_feed": "Mweke mtoto joto na endelea kumnyonyesha/kumlisha kama anaweza.",
-        "act_malaria_protocol": "Ikiwezekana na umefunzwa, fuata mwongozo wa malaria; vinginevyo peleka kituoni.",
-        "act_sam_assess": "Omba tathmini ya lishe/kliniki haraka (SAM).",
-        "act_follow_local": "Fuata mwongozo wa eneo; panga ufuatiliaji kama dalili zinaendelea au zinaongezeka.",
-        "act_pneumonia_same_day": "Kama pumzi ni nyingi kwa umri au hali inazidi, nenda kituoni siku hiyo.",
-        "act_malaria_test": "Kama homa inaendelea, fanya kipimo cha malaria na fuata mwongozo wa matibabu.",
-        "act_muac_link": "Pima MUAC kama haijapimwa; unganisha huduma za lishe kama zipo.",
-        "act_young_infant_prompt": "Watoto wachanga huzorota haraka; tafuta tathmini ya kituo mapema.",
-
-        "tip_keep_warm": "Mweke mtoto joto.",
-        "tip_feed_fluids": "Endelea kumnyonyesha/kumlisha na mpe maji mara kwa mara.",
-        "tip_breathing_urgent": "Kama kupumua kunakuwa kugumu, kifua kinavuta ndani, au hawezi kunywa—peleka haraka.",
-
-        "tip_fever_care": "Hudumia homa kwa mwongozo wa eneo na mpe maji.",
-        "tip_get_rdt": "Kama unaweza, pata kipimo cha haraka cha malaria mapema.",
-        "tip_severe_malaria_urgent": "Akiwa mchovu sana, ana degedege, au hawezi kunywa—peleka haraka.",
-
-        "tip_bf_continue": "Endelea kumnyonyesha kama ananyonyesha.",
-        "tip_small_meals": "Mpe mlo mdogo mdogo mara nyingi kama anaweza kula.",
-        "tip_safe_water": "Nawa mikono na tumia maji salama kupunguza maambukizi.",
-
-        "tip_skin_to_skin": "Mweke joto (ngozi kwa ngozi ikiwezekana).",
-        "tip_bf_frequent": "Mnyonyeshe mara kwa mara kama anaweza.",
-        "tip_neonate_urgent": "Akiwa halei vizuri, ana homa/joto la chini, au hasogei—peleka haraka.",
-    },
-
-    "hi": {
-        "app_title": "Toto Gemma — 5 साल से कम की स्क्रीनिंग",
-        "app_subtitle": "यह सिर्फ स्क्रीनिंग/कोचिंग के लिए है। अगर खतरे के लक्षण हों तो तुरंत रेफर करें।",
-        "local_storage": "लोकल स्टोरेज (SQLite)",
-        "language": "भाषा",
-        "translate": "अनुवाद",
-        "english": "English",
-        "swahili": "Kiswahili",
-        "hindi": "हिंदी",
-
-        "add_patient_title": "बच्चा जोड़ें (लोकल)",
-        "add_patient_hint": "सिर्फ इसी डिवाइस पर सेव होता है। जानकारी कम रखें।",
-        "name_nickname": "नाम / उपनाम",
-        "village_optional": "गाँव (वैकल्पिक)",
-        "default_age_group": "डिफ़ॉल्ट आयु समूह",
-        "add_patient_btn": "जोड़ें",
-
-        "patient_list": "बच्चों की सूची",
-        "no_patients": "अभी कोई बच्चा नहीं।",
-        "select": "चुनें",
-        "delete": "हटाएँ",
-        "select_hint": "हिस्ट्री सेव करने के लिए बच्चा चुनें (वैकल्पिक)।",
-        "recent_screenings": "हाल की स्क्रीनिंग (5)",
-        "no_screenings": "इस बच्चे की अभी कोई स्क्रीनिंग नहीं।",
-
-        "screening_form": "स्क्रीनिंग फ़ॉर्म",
-        "screening_hint": "जो लागू हो वही चुनें। दाईं ओर बच्चा चुना हो तो हिस्ट्री सेव होगी।",
-        "age_group": "आयु समूह",
-        "caregiver_wa": "केयरगिवर WhatsApp (वैकल्पिक)",
-        "supervisor_wa": "सुपरवाइज़र WhatsApp (वैकल्पिक)",
-        "digits_only": "सिर्फ अंक, देश कोड सहित",
-        "assessor": "असेसर/CHW नाम (वैकल्पिक)",
-        "include_patient_name": "WhatsApp में बच्चे का नाम जोड़ें?",
-        "include_village": "WhatsApp में गाँव जोड़ें?",
-        "only_used_if_patient": "सिर्फ तब जब बच्चा चुना हो।",
-        "no": "नहीं",
-        "yes": "हाँ",
-
-        "danger_signs": "खतरे के लक्षण",
-        "danger_signs_hint": "अगर कोई भी 'हाँ' हो, तुरंत रेफर करें।",
-        "ds_drink": "पी/दूध नहीं पी पा रहा?",
-        "ds_vomit": "सब कुछ उल्टी कर देता?",
-        "ds_convulsions": "दौरे?",
-        "ds_lethargy": "बहुत सुस्त/बेहोश?",
-
-        "main_symptoms": "मुख्य लक्षण",
-        "fever": "अभी या पिछले 2 दिनों में बुखार?",
-        "cough_breath": "खाँसी या साँस में तकलीफ़?",
-        "rr": "प्रति मिनट साँस (वैकल्पिक)",
-        "rr_hint": "टिप: बच्चा शांत हो तब 60 सेकंड में साँस गिनें।",
-        "chest_indrawing": "छाती अंदर धँसती है?",
-        "stridor": "शांत होने पर भी सीटी जैसी आवाज़?",
-
-        "nutrition": "पोषण",
-        "muac": "MUAC रंग (6–59 महीने)",
-        "muac_not_measured": "नहीं मापा",
-        "muac_green": "हरा",
-        "muac_yellow": "पीला",
-        "muac_red": "लाल",
-        "oedema": "दोनों पैरों में सूजन?",
-
-        "young_infant_title": "नवजात/छोटा शिशु (0–2 महीने)",
-        "young_infant_hint": "सिर्फ 0–2 महीने होने पर ही भरें।",
-        "not_feeding": "ठीक से नहीं पी रहा?",
-        "stim_only": "सिर्फ जगाने पर ही हिलता?",
-
-        "malaria_test": "मलेरिया टेस्ट (यदि उपलब्ध)",
-        "rdt_result": "RDT परिणाम",
-        "rdt_not_done": "नहीं किया",
-        "rdt_negative": "नकारात्मक",
-        "rdt_positive": "सकारात्मक",
-
-        "get_result": "परिणाम",
-        "reset": "रीसेट",
-
-        "result_actions": "अभी क्या करें",
-        "result_tips": "केयरगिवर के लिए सलाह",
-        "also_consider": "यह भी संभव",
-
-        "share_title": "WhatsApp से शेयर करें",
-        "share_hint": "ऑटो-सेंड नहीं होता। WhatsApp में मैसेज तैयार मिलेगा।",
-        "message_to_share": "शेयर करने वाला संदेश",
-        "share_caregiver": "केयरगिवर को",
-        "share_supervisor": "सुपरवाइज़र को",
-        "copy_summary": "कॉपी",
-
-        "analytics": "एनालिटिक्स (लोकल)",
-        "analytics_hint": "सेव की गई स्क्रीनिंग से एडमिन स्टैट्स।",
-        "time_range": "समय",
-        "last_7": "पिछले 7 दिन",
-        "last_30": "पिछले 30 दिन",
-        "all_time": "सभी",
-        "assessor_filter": "असेसर फ़िल्टर",
-        "all": "सभी",
-        "apply": "लागू करें",
-        "reset_filters": "रीसेट",
-        "total": "कुल",
-        "high": "हाई",
-        "medium": "मीडियम",
-        "low": "लो",
-        "top_conditions": "टॉप कंडीशन्स",
-        "common_danger_signs": "आम खतरे के लक्षण",
-        "assessor_performance": "असेसर परफॉर्मेंस",
-
-        "quick_guidance": "क्विक गाइड",
-        "privacy": "प्राइवेसी",
-        "privacy_text": "मैसेज छोटा रखें, संवेदनशील पहचान न जोड़ें। WhatsApp नंबर वैकल्पिक हैं।",
-
-        "cond_pneumonia": "निमोनिया",
-        "cond_malaria": "मलेरिया",
-        "cond_malnutrition": "कुपोषण",
-        "cond_neonatal": "नवजात जटिलताएँ",
-
-        "share_header": "Toto Gemma — स्क्रीनिंग परिणाम",
-        "share_patient": "बच्चा: {name}",
-        "share_village": "गाँव: {village}",
-        "share_risk": "रिस्क: {risk}",
-        "share_most_likely": "सबसे संभव: {cond} ({pct}%)",
-        "share_also": "यह भी संभव: {alt}",
-        "share_next_steps": "अगले कदम:",
-        "share_danger_present": "खतरे के लक्षण हैं: तुरंत इलाज लें।",
-
-        "act_refer_urgent": "तुरंत नज़दीकी स्वास्थ्य केंद्र रेफर करें।",
-        "act_keep_warm_feed": "बच्चे को गर्म रखें और संभव हो तो दूध/खाना जारी रखें।",
-        "act_malaria_protocol": "अगर प्रशिक्षित हैं तो लोकल मलेरिया प्रोटोकॉल फॉलो करें, वरना रेफर करें।",
-        "act_sam_assess": "तुरंत पोषण/क्लिनिक आकलन (SAM) करवाएँ।",
-        "act_follow_local": "लोकल प्रोटोकॉल फॉलो करें; लक्षण बने रहें/बढ़ें तो फॉलो-अप करें।",
-        "act_pneumonia_same_day": "साँस तेज़/बिगड़ रही हो तो उसी दिन केंद्र जाएँ।",
-        "act_malaria_test": "बुखार जारी रहे तो टेस्ट कराएँ और लोकल गाइडेंस फॉलो करें।",
-        "act_muac_link": "MUAC नहीं मापा तो मापें; पोषण सेवाओं से जोड़ें।",
-        "act_young_infant_prompt": "छोटे शिशु जल्दी बिगड़ सकते हैं; जल्द आकलन कराएँ।",
-
-        "tip_keep_warm": "बच्चे को गर्म रखें।",
-        "tip_feed_fluids": "दूध/खाना जारी रखें और तरल दें।",
-        "tip_breathing_urgent": "साँस मुश्किल, छाती धँसे, या पी न पाए—तुरंत जाएँ।",
-
-        "tip_fever_care": "लोकल गाइडेंस के अनुसार बुखार देखभाल करें और हाइड्रेट रखें।",
-        "tip_get_rdt": "हो सके तो जल्द मलेरिया रैपिड टेस्ट कराएँ।",
-        "tip_severe_malaria_urgent": "बहुत सुस्त/दौरे/पी न पाए—तुरंत जाएँ।",
-
-        "tip_bf_continue": "अगर बच्चा स्तनपान करता है तो जारी रखें।",
-        "tip_small_meals": "छोटे-छोटे, बार-बार, ऊर्जा-युक्त भोजन दें।",
-        "tip_safe_water": "हाथ धोएँ और सुरक्षित पानी उपयोग करें।",
-
-        "tip_skin_to_skin": "बच्चे को गर्म रखें (त्वचा से त्वचा)।",
-        "tip_bf_frequent": "बार-बार स्तनपान कराएँ।",
-        "tip_neonate_urgent": "ठीक से न पिए/बुखार या ठंड/कम हिले—तुरंत जाएँ।",
-    },
-}
-
+# One JSON table per language in i18n/, read on first use. Missing keys
+# fall back to English.
+I18N_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "i18n")
 LANG_CHOICES = [("en", "english"), ("sw", "swahili"), ("hi", "hindi")]
 
 
-def make_t(lang: str):
-    base = TRANSLATIONS["en"]
-    cur = TRANSLATIONS.get(lang, base)
+LANGUAGES = tuple(code for code, _ in LANG_CHOICES)
+
+
+@functools.lru_cache(maxsize=None)
+def translation_table(lang: str) -> dict:
+    with open(os.path.join(I18N_DIR, f"{lang}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Translators are built once per language, on first use: the English
+# fallbacks are flattened into each table, and only strings with
+# placeholders go through str.format.
+
+@functools.lru_cache(maxsize=None)
+def _build_translator(lang: str):
+    table = {**translation_table("en"), **translation_table(lang)}
+    formatters = {k: s.format for k, s in table.items() if "{" in s or "}" in s}
 
     def t(key: str, **kwargs):
-        s = cur.get(key, base.get(key, key))
+        fmt = formatters.get(key)
+        if fmt is None:
+            return table.get(key, key)
         try:
-            return s.format(**kwargs)
+            return fmt(**kwargs)
         except Exception:
-            return s
+            return table[key]
 
     return t
 
+_CONDITION_KEYS = {
+    "Pneumonia": "cond_pneumonia",
+    "Malaria": "cond_malaria",
+    "Malnutrition": "cond_malnutrition",
+    "Neonatal complications": "cond_neonatal",
+}
 
-def condition_label(lang: str, name: str) -> str:
+@functools.lru_cache(maxsize=None)
+def _condition_labels(lang: str) -> dict:
     t = make_t(lang)
-    mapping = {
-        "Pneumonia": t("cond_pneumonia"),
-        "Malaria": t("cond_malaria"),
-        "Malnutrition": t("cond_malnutrition"),
-        "Neonatal complications": t("cond_neonatal"),
-    }
-    return mapping.get(name, name)
-
-
-# -------------------- UI --------------------
-
-HTML = r"""
-<!doctype html>
-<html lang="{{ lang }}">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width,initial-scale=1">
-  <meta name="color-scheme" content="light dark">
-  <title>{{ t('app_title') }}</title>
-  <style>
-    :root {
-      --bg: #0b1020;
-      --surface: rgba(255,255,255,0.06);
-      --card: rgba(255,255,255,0.08);
-      --text: rgba(255,255,255,0.92);
-      --muted: rgba(255,255,255,0.68);
-      --border: rgba(255,255,255,0.14);
-      --shadow: 0 10px 30px rgba(0,0,0,0.28);
-      --accent: #7c6cff;
-      --accent2: #20c997;
-      --danger: #ff5c77;
-      --warn: #ffcf5a;
-      --ok: #2fd07c;
-      --radius: 16px;
-    }
-    @media (prefers-color-scheme: light) {
-      :root {
-        --bg: #f6f7fb;
-        --surface: rgba(0,0,0,0.03);
-        --card: rgba(255,255,255,0.92);
-        --text: rgba(10,14,28,0.92);
-        --muted: rgba(10,14,28,0.62);
-        --border: rgba(10,14,28,0.10);
-        --shadow: 0 10px 30px rgba(10,14,28,0.10);
-        --accent: #5b57ff;
-        --accent2: #12b886;
-        --danger: #e03131;
-        --warn: #f59f00;
-        --ok: #2f9e44;
-      }
-    }
-
-    * { box-sizing: border-box; }
-    html, body { height: 100%; }
-    body {
-      margin: 0;
-      font-family: system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif;
-      color: var(--text);
-      background:
-        radial-gradient(1200px 700px at 10% 0%, rgba(124,108,255,0.25), transparent 60%),
-        radial-gradient(900px 500px at 90% 20%, rgba(32,201,151,0.20), transparent 55%),
-        var(--bg);
-    }
-    a { color: inherit; }
-
-    .container { max-width: 1100px; margin: 0 auto; padding: 18px 14px 28px; }
-
-    .topbar {
-      display: flex;
-      align-items: center;
-      justify-content: space-between;
-      gap: 12px;
-      padding: 14px;
-      border: 1px solid var(--border);
-      background: var(--surface);
-      border-radius: var(--radius);
-      box-shadow: var(--shadow);
-    }
-    .brand { display: grid; gap: 2px; }
-    .brand h1 { font-size: 1.05rem; margin: 0; letter-spacing: 0.2px; }
-    .brand p { margin: 0; color: var(--muted); font-size: 0.92rem; line-height: 1.35; }
-
-    .badges { display:flex; align-items:center; gap:10px; flex-wrap:wrap; justify-content:flex-end; }
-    .badge {
-      display:inline-flex;
-      align-items:center;
-      gap: 8px;
-      padding: 8px 10px;
-      border-radius: 999px;
-      border: 1px solid var(--border);
-      background: rgba(255,255,255,0.06);
-      font-weight: 700;
-      font-size: 0.88rem;
-      white-space: nowrap;
-    }
-    .badge-dot { width: 9px; height: 9px; border-radius: 50%; background: var(--accent2); box-shadow: 0 0 0 3px rgba(32,201,151,0.18); }
-
-    .langform { display:flex; align-items:center; gap:8px; }
-    .langlabel { color: var(--muted); font-weight: 800; font-size: 0.88rem; }
-
-    .langselect {
-      min-height: 40px;
-      padding: 8px 34px 8px 10px;
-      border-radius: 999px;
-      border: 1px solid var(--border);
-      background: rgba(255,255,255,0.06);
-      color: var(--text);
-      outline: none;
-      appearance: none;
-      background-image:
-        linear-gradient(45deg, transparent 50%, var(--muted) 50%),
-        linear-gradient(135deg, var(--muted) 50%, transparent 50%);
-      background-position: calc(100% - 18px) 55%, calc(100% - 13px) 55%;
-      background-size: 6px 6px, 6px 6px;
-      background-repeat: no-repeat;
-    }
-    .langselect option { color: #0a0e1c; background: #ffffff; }
-
-    /* Google Translate widget styling */
-    .gt-wrap { display:flex; align-items:center; gap:8px; }
-    .gt-label { color: var(--muted); font-weight: 800; font-size: 0.88rem; }
-    #google_translate_element { display:inline-flex; align-items:center; }
-    .goog-te-gadget { font-size: 0; } /* kill default text */
-    .goog-te-gadget span { display:none; }
-    .goog-te-combo {
-      min-height: 40px !important;
-      padding: 8px 34px 8px 10px !important;
-      border-radius: 999px !important;
-      border: 1px solid var(--border) !important;
-      background: rgba(255,255,255,0.06) !important;
-      color: var(--text) !important;
-      outline: none !important;
-      appearance: none !important;
-      margin: 0 !important;
-      font-size: 0.88rem !important;
-    }
-    /* the dropdown list itself is browser-native; options need contrast */
-    .goog-te-combo option { color:#0a0e1c; background:#ffffff; }
+    return {name: t(key) for name, key in _CONDITION_KEYS.items()}
 
-    .grid { display: grid; gap: 14px; margin-top: 14px; }
-    @media (min-width: 980px) {
-      .grid { grid-template-columns: 1.15fr 0.85fr; align-items: start; }
-    }
+# Language-neutral condition codes stored in screenings.condition_code and
+# the analytics rollup. Never renumber; 0 means unknown.
+CONDITION_CODES = {"Pneumonia": 1, "Malaria": 2, "Malnutrition": 3, "Neonatal complications": 4}
+CONDITION_NAMES = {code: name for name, code in CONDITION_CODES.items()}
 
-    .card {
-      border: 1px solid var(--border);
-      background: var(--card);
-      border-radius: var(--radius);
-      padding: 14px;
-      box-shadow: var(--shadow);
-    }
-    .card + .card { margin-top: 14px; }
-
-    .card h2 { margin: 0 0 10px; font-size: 1.02rem; }
-    .card h3 { margin: 0 0 10px; font-size: 0.98rem; }
-
-    .muted { color: var(--muted); font-size: 0.95rem; }
-    .hint { margin-top: 6px; color: var(--muted); font-size: 0.9rem; }
-    .divider { height: 1px; background: var(--border); margin: 12px 0; }
-
-    .result { position: relative; overflow: hidden; }
-    .result::before {
-      content: "";
-      position: absolute;
-      inset: -2px;
-      background: radial-gradient(500px 250px at 15% 0%, rgba(124,108,255,0.35), transparent 60%);
-      pointer-events: none;
-      opacity: 0.6;
-    }
-    .result > * { position: relative; }
-
-    .pill-row { display:flex; flex-wrap:wrap; gap: 8px; margin-bottom: 10px; }
-    .pill, .chip {
-      display:inline-flex;
-      align-items:center;
-      gap: 8px;
-      padding: 8px 10px;
-      border-radius: 999px;
-      border: 1px solid var(--border);
-      background: rgba(255,255,255,0.06);
-      font-weight: 900;
-      font-size: 0.88rem;
-      white-space: nowrap;
+def legacy_condition_codes() -> dict:
+    # any label a screening may have been saved under -> code
+    return {
+        label: CONDITION_CODES[name]
+        for lang in LANGUAGES
+        for name, label in _condition_labels(lang).items()
     }
 
-    .danger { border-color: rgba(255,92,119,0.35); background: linear-gradient(180deg, rgba(255,92,119,0.16), rgba(255,255,255,0.06)); }
-    .warn   { border-color: rgba(255,207,90,0.35); background: linear-gradient(180deg, rgba(255,207,90,0.16), rgba(255,255,255,0.06)); }
-    .ok     { border-color: rgba(47,208,124,0.35); background: linear-gradient(180deg, rgba(47,208,124,0.16), rgba(255,255,255,0.06)); }
 
-    form { margin: 0; }
-    label { display:block; margin: 10px 0 6px; font-weight: 900; }
+def make_t(lang: str):
+    return _build_translator(lang if lang in LANGUAGES else "en")
 
-    .row { display: grid; grid-template-columns: 1fr; gap: 10px; }
-    @media (min-width: 640px) { .row { grid-template-columns: 1fr 1fr; } }
 
-    .row3 { display: grid; grid-template-columns: 1fr; gap: 10px; }
-    @media (min-width: 960px) { .row3 { grid-template-columns: 1fr 1fr 1fr; align-items: end; } }
+def condition_label(lang: str, name: str) -> str:
+    return _condition_labels(lang if lang in LANGUAGES else "en").get(name, name)
 
-    /* Alignment fix: consistent label height on larger screens */
-    @media (min-width: 640px) {
-      .row > div > label,
-      .row3 > div > label { min-height: 2.6em; display:flex; align-items:flex-end; }
-    }
 
-    input[type="number"], input[type="text"], input[type="tel"], select, textarea {
-      width: 100%;
-      padding: 11px 12px;
-      border-radius: 12px;
-      border: 1px solid var(--border);
-      background: rgba(255,255,255,0.06);
-      color: var(--text);
-      outline: none;
-      min-height: 44px;
-    }
-    textarea { min-height: 132px; resize: vertical; }
-
-    /* Dropdown options visibility fix */
-    select { color-scheme: light dark; }
-    select option { color: #0a0e1c; background: #ffffff; }
-
-    select {
-      appearance: none;
-      background-image:
-        linear-gradient(45deg, transparent 50%, var(--muted) 50%),
-        linear-gradient(135deg, var(--muted) 50%, transparent 50%);
-      background-position: calc(100% - 18px) calc(1em + 2px), calc(100% - 13px) calc(1em + 2px);
-      background-size: 6px 6px, 6px 6px;
-      background-repeat: no-repeat;
-      padding-right: 40px;
-    }
+def condition_code_label(lang: str, code) -> str:
+    return condition_label(lang, CONDITION_NAMES.get(code, "-"))
 
-    input:focus, select:focus, textarea:focus {
-      border-color: rgba(124,108,255,0.65);
-      box-shadow: 0 0 0 4px rgba(124,108,255,0.18);
-    }
 
-    .segmented {
-      display: grid;
-      grid-template-columns: 1fr 1fr;
-      border: 1px solid var(--border);
-      border-radius: 14px;
-      overflow: hidden;
-      background: rgba(255,255,255,0.04);
-      min-height: 44px;
-    }
-    .segmented input { position: absolute; opacity: 0; pointer-events: none; }
-    .segmented label {
-      margin: 0;
-      padding: 10px 12px;
-      font-weight: 950;
-      display: flex;
-      align-items: center;
-      justify-content: center;
-      cursor: pointer;
-      user-select: none;
-      min-height: 44px;
-    }
-    .segmented label:hover { background: rgba(255,255,255,0.06); }
-    .segmented input:checked + label {
-      background: rgba(124,108,255,0.20);
-      border-left: 1px solid rgba(124,108,255,0.25);
-      border-right: 1px solid rgba(124,108,255,0.25);
-    }
-    .segmented label:first-of-type { border-right: 1px solid var(--border); }
-
-    .btn-row { display:flex; gap: 10px; flex-wrap: wrap; margin-top: 12px; }
-    .btn {
-      padding: 12px 14px;
-      border: 1px solid transparent;
-      border-radius: 14px;
-      font-weight: 950;
-      cursor: pointer;
-      display:inline-flex;
-      align-items:center;
-      justify-content:center;
-      gap: 10px;
-      text-decoration:none;
-      text-align:center;
-      min-height: 44px;
-      flex: 1 1 220px;
-    }
-    .btn-primary { background: var(--accent); color: #fff; }
-    .btn-secondary { background: rgba(255,255,255,0.08); border-color: var(--border); color: var(--text); }
-    .btn-danger { background: rgba(255,92,119,0.18); border-color: rgba(255,92,119,0.35); color: var(--text); }
-    .btn-whatsapp { background: #25D366; color: #fff; }
-
-    /* IMPORTANT: buttons only at bottom (NOT sticky/following) */
-    .bottom-actions { margin-top: 14px; }
-
-    .hidden { display: none !important; }
-
-    ul { margin: 8px 0 0 18px; }
-    li { margin: 6px 0; }
-
-    .table { width: 100%; border-collapse: collapse; }
-    .table th, .table td { text-align: left; padding: 10px; border-bottom: 1px solid rgba(255,255,255,0.10); vertical-align: top; }
-    @media (prefers-color-scheme: light) { .table th, .table td { border-bottom: 1px solid rgba(10,14,28,0.10); } }
-    .nowrap { white-space: nowrap; }
-
-    .mini-bar {
-      height: 10px;
-      border-radius: 999px;
-      background: rgba(255,255,255,0.08);
-      border: 1px solid var(--border);
-      overflow: hidden;
-    }
-    .mini-bar > div {
-      height: 100%;
-      background: rgba(124,108,255,0.55);
-      width: 0%;
-    }
-  </style>
-</head>
-<body>
-  {% macro selected(name, value, default_value='') -%}
-    {% if form.get(name, default_value) == value %}selected{% endif %}
-  {%- endmacro %}
-  {% macro checked(name, value, default_value='No') -%}
-    {% if form.get(name, default_value) == value %}checked{% endif %}
-  {%- endmacro %}
-
-  <div class="container">
-    <div class="topbar">
-      <div class="brand">
-        <h1>{{ t('app_title') }}</h1>
-        <p>{{ t('app_subtitle') }}</p>
-      </div>
-
-      <div class="badges" aria-label="Status">
-        <span class="badge"><span class="badge-dot" aria-hidden="true"></span>{{ t('local_storage') }}</span>
-
-        <!-- Local translations (fast/offline, your curated strings) -->
-        <form class="langform" method="get">
-          {% if selected_patient %}
-            <input type="hidden" name="patient_id" value="{{ selected_patient['id'] }}">
-          {% endif %}
-          <input type="hidden" name="ar" value="{{ ar }}">
-          <input type="hidden" name="aa" value="{{ aa }}">
-          <span class="langlabel">{{ t('language') }}</span>
-          <select class="langselect" name="lang" onchange="this.form.submit()">
-            {% for code, label_key in lang_choices %}
-              <option value="{{ code }}" {% if lang == code %}selected{% endif %}>{{ t(label_key) }}</option>
-            {% endfor %}
-          </select>
-        </form>
-
-        <!-- Google Translate (for any other language on-demand) -->
-        <span class="badge">
-          <span class="gt-label">{{ t('translate') }}</span>
-          <span id="google_translate_element"></span>
-        </span>
-      </div>
-    </div>
-
-    {% if message %}
-      <div class="card warn" style="margin-top:14px;">
-        <strong>{{ message }}</strong>
-      </div>
-    {% endif %}
-
-    <div class="grid">
-      <main>
-        {% if result %}
-          <section class="card result {{ result.box_class }}" aria-label="Screening result">
-            <div class="pill-row">
-              <span class="pill">{{ t('share_risk', risk=result.risk) }}</span>
-              <span class="pill">{{ t('share_most_likely', cond=result.top_condition_label, pct=result.certainty) }}</span>
-              <span class="pill">{{ result.certainty }}%</span>
-            </div>
-
-            <h2>{{ t('result_actions') }}</h2>
-            <ul>
-              {% for s in result.actions %}
-                <li>{{ s }}</li>
-              {% endfor %}
-            </ul>
-
-            <div class="divider"></div>
-
-            <h2>{{ t('result_tips') }}</h2>
-            <ul>
-              {% for s in result.tips %}
-                <li>{{ s }}</li>
-              {% endfor %}
-            </ul>
-
-            <div class="divider"></div>
-
-            <h2>{{ t('also_consider') }}</h2>
-            <ul>
-              {% for name, pct in result.alternatives %}
-                <li>{{ name }} — {{ pct }}%</li>
-              {% endfor %}
-            </ul>
-          </section>
-
-          <section class="card" aria-label="Share via WhatsApp">
-            <h2>{{ t('share_title') }}</h2>
-            <p class="muted">{{ t('share_hint') }}</p>
-
-            <label for="shareText">{{ t('message_to_share') }}</label>
-            <textarea id="shareText" readonly>{{ result.share_message }}</textarea>
-
-            <div class="btn-row">
-              <a class="btn btn-whatsapp" href="{{ result.wa_caregiver_url }}" target="_blank" rel="noopener">{{ t('share_caregiver') }}</a>
-              <a class="btn btn-whatsapp" href="{{ result.wa_supervisor_url }}" target="_blank" rel="noopener">{{ t('share_supervisor') }}</a>
-              <button class="btn btn-secondary" type="button" onclick="copyShareText()">{{ t('copy_summary') }}</button>
-            </div>
-
-            <p id="copyStatus" class="muted" style="margin-top:10px;"></p>
-          </section>
-        {% endif %}
-
-        <section class="card" aria-label="Add patient">
-          <h2>{{ t('add_patient_title') }}</h2>
-          <p class="muted">{{ t('add_patient_hint') }}</p>
-
-          <form method="post">
-            <input type="hidden" name="action" value="add_patient">
-            <input type="hidden" name="lang" value="{{ lang }}">
-            <input type="hidden" name="ar" value="{{ ar }}">
-            <input type="hidden" name="aa" value="{{ aa }}">
-
-            <div class="row">
-              <div>
-                <label for="p_name">{{ t('name_nickname') }}</label>
-                <input id="p_name" type="text" name="p_name" placeholder="e.g., Amina" required>
-              </div>
-              <div>
-                <label for="p_village">{{ t('village_optional') }}</label>
-                <input id="p_village" type="text" name="p_village" placeholder="e.g., Kibera">
-              </div>
-            </div>
-
-            <label for="p_age_group">{{ t('default_age_group') }}</label>
-            <select id="p_age_group" name="p_age_group" required>
-              <option value="0_2m">0–2 months</option>
-              <option value="2_12m">2–12 months</option>
-              <option value="1_5y" selected>1–5 years</option>
-            </select>
-
-            <div class="btn-row">
-              <button class="btn btn-secondary" type="submit">{{ t('add_patient_btn') }}</button>
-            </div>
-          </form>
-        </section>
-
-        <section id="screen" class="card" aria-label="Under-5 screening form">
-          <h2>{{ t('screening_form') }}</h2>
-          <p class="muted">{{ t('screening_hint') }}</p>
-
-          {% if selected_patient %}
-            <div class="pill-row">
-              <span class="chip">
-                {{ t('current_patient', name=selected_patient['name'], village=((" — " + selected_patient['village']) if selected_patient['village'] else "")) }}
-              </span>
-            </div>
-          {% endif %}
-
-          <form method="post" novalidate>
-            <input type="hidden" name="action" value="run_screening">
-            <input type="hidden" name="lang" value="{{ lang }}">
-            <input type="hidden" name="ar" value="{{ ar }}">
-            <input type="hidden" name="aa" value="{{ aa }}">
-
-            <div class="row3">
-              <div>
-                <label for="age_group">{{ t('age_group') }}</label>
-                <select id="age_group" name="age_group" required>
-                  <option value="0_2m" {{ selected('age_group','0_2m', default_age_group) }}>0–2 months</option>
-                  <option value="2_12m" {{ selected('age_group','2_12m', default_age_group) }}>2–12 months</option>
-                  <option value="1_5y" {{ selected('age_group','1_5y', default_age_group) }}>1–5 years</option>
-                </select>
-              </div>
-              <div>
-                <label for="wa_caregiver">{{ t('caregiver_wa') }}</label>
-                <input id="wa_caregiver" type="tel" name="wa_caregiver" inputmode="numeric" autocomplete="tel"
-                       value="{{ form.get('wa_caregiver','') }}" placeholder="{{ t('digits_only') }}">
-              </div>
-              <div>
-                <label for="wa_supervisor">{{ t('supervisor_wa') }}</label>
-                <input id="wa_supervisor" type="tel" name="wa_supervisor" inputmode="numeric" autocomplete="tel"
-                       value="{{ form.get('wa_supervisor','') }}" placeholder="{{ t('digits_only') }}">
-              </div>
-            </div>
-
-            <div class="row" style="margin-top: 6px;">
-              <div>
-                <label for="assessor">{{ t('assessor') }}</label>
-                <input id="assessor" type="text" name="assessor" value="{{ form.get('assessor','') }}" placeholder="e.g., Fatima">
-              </div>
-              <div>
-                <label>{{ t('include_patient_name') }}</label>
-                <div class="segmented" role="group">
-                  <input id="include_name_no" type="radio" name="include_name" value="No" {{ checked('include_name','No','No') }}>
-                  <label for="include_name_no">{{ t('no') }}</label>
-                  <input id="include_name_yes" type="radio" name="include_name" value="Yes" {{ checked('include_name','Yes','No') }}>
-                  <label for="include_name_yes">{{ t('yes') }}</label>
-                </div>
-                <div class="hint">{{ t('only_used_if_patient') }}</div>
-              </div>
-            </div>
-
-            <div class="row" style="margin-top: 6px;">
-              <div>
-                <label>{{ t('include_village') }}</label>
-                <div class="segmented" role="group">
-                  <input id="include_village_no" type="radio" name="include_village" value="No" {{ checked('include_village','No','No') }}>
-                  <label for="include_village_no">{{ t('no') }}</label>
-                  <input id="include_village_yes" type="radio" name="include_village" value="Yes" {{ checked('include_village','Yes','No') }}>
-                  <label for="include_village_yes">{{ t('yes') }}</label>
-                </div>
-                <div class="hint">{{ t('only_used_if_patient') }}</div>
-              </div>
-              <div></div>
-            </div>
-
-            <div class="divider"></div>
-
-            <div class="card warn" aria-label="Danger signs">
-              <h3>{{ t('danger_signs') }}</h3>
-              <p class="muted">{{ t('danger_signs_hint') }}</p>
-
-              <div class="row">
-                <div>
-                  <label>{{ t('ds_drink') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="ds_drink_no" type="radio" name="ds_drink" value="No" {{ checked('ds_drink','No','No') }}>
-                    <label for="ds_drink_no">{{ t('no') }}</label>
-                    <input id="ds_drink_yes" type="radio" name="ds_drink" value="Yes" {{ checked('ds_drink','Yes','No') }}>
-                    <label for="ds_drink_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-                <div>
-                  <label>{{ t('ds_vomit') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="ds_vomit_no" type="radio" name="ds_vomit" value="No" {{ checked('ds_vomit','No','No') }}>
-                    <label for="ds_vomit_no">{{ t('no') }}</label>
-                    <input id="ds_vomit_yes" type="radio" name="ds_vomit" value="Yes" {{ checked('ds_vomit','Yes','No') }}>
-                    <label for="ds_vomit_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-                <div>
-                  <label>{{ t('ds_convulsions') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="ds_convulsions_no" type="radio" name="ds_convulsions" value="No" {{ checked('ds_convulsions','No','No') }}>
-                    <label for="ds_convulsions_no">{{ t('no') }}</label>
-                    <input id="ds_convulsions_yes" type="radio" name="ds_convulsions" value="Yes" {{ checked('ds_convulsions','Yes','No') }}>
-                    <label for="ds_convulsions_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-                <div>
-                  <label>{{ t('ds_lethargy') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="ds_lethargy_no" type="radio" name="ds_lethargy" value="No" {{ checked('ds_lethargy','No','No') }}>
-                    <label for="ds_lethargy_no">{{ t('no') }}</label>
-                    <input id="ds_lethargy_yes" type="radio" name="ds_lethargy" value="Yes" {{ checked('ds_lethargy','Yes','No') }}>
-                    <label for="ds_lethargy_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-              </div>
-            </div>
-
-            <div class="divider"></div>
-
-            <h3>{{ t('main_symptoms') }}</h3>
-            <div class="row">
-              <div>
-                <label>{{ t('fever') }}</label>
-                <div class="segmented" role="group">
-                  <input id="fever_no" type="radio" name="fever" value="No" {{ checked('fever','No','No') }}>
-                  <label for="fever_no">{{ t('no') }}</label>
-                  <input id="fever_yes" type="radio" name="fever" value="Yes" {{ checked('fever','Yes','No') }}>
-                  <label for="fever_yes">{{ t('yes') }}</label>
-                </div>
-              </div>
-              <div>
-                <label>{{ t('cough_breath') }}</label>
-                <div class="segmented" role="group">
-                  <input id="cough_breath_no" type="radio" name="cough_breath" value="No" {{ checked('cough_breath','No','No') }}>
-                  <label for="cough_breath_no">{{ t('no') }}</label>
-                  <input id="cough_breath_yes" type="radio" name="cough_breath" value="Yes" {{ checked('cough_breath','Yes','No') }}>
-                  <label for="cough_breath_yes">{{ t('yes') }}</label>
-                </div>
-              </div>
-            </div>
-
-            <label for="rr">{{ t('rr') }}</label>
-            <input id="rr" type="number" name="rr" min="0" max="120" inputmode="numeric"
-                   value="{{ form.get('rr','') }}" placeholder="e.g., 48">
-            <div class="hint">{{ t('rr_hint') }}</div>
-
-            <div class="row" style="margin-top: 10px;">
-              <div>
-                <label>{{ t('chest_indrawing') }}</label>
-                <div class="segmented" role="group">
-                  <input id="chest_indrawing_no" type="radio" name="chest_indrawing" value="No" {{ checked('chest_indrawing','No','No') }}>
-                  <label for="chest_indrawing_no">{{ t('no') }}</label>
-                  <input id="chest_indrawing_yes" type="radio" name="chest_indrawing" value="Yes" {{ checked('chest_indrawing','Yes','No') }}>
-                  <label for="chest_indrawing_yes">{{ t('yes') }}</label>
-                </div>
-              </div>
-              <div>
-                <label>{{ t('stridor') }}</label>
-                <div class="segmented" role="group">
-                  <input id="stridor_no" type="radio" name="stridor" value="No" {{ checked('stridor','No','No') }}>
-                  <label for="stridor_no">{{ t('no') }}</label>
-                  <input id="stridor_yes" type="radio" name="stridor" value="Yes" {{ checked('stridor','Yes','No') }}>
-                  <label for="stridor_yes">{{ t('yes') }}</label>
-                </div>
-              </div>
-            </div>
-
-            <div class="divider"></div>
-
-            <h3>{{ t('nutrition') }}</h3>
-            <div class="row">
-              <div>
-                <label for="muac">{{ t('muac') }}</label>
-                <select id="muac" name="muac" required>
-                  <option value="not_measured" {{ selected('muac','not_measured','not_measured') }}>{{ t('muac_not_measured') }}</option>
-                  <option value="green" {{ selected('muac','green','not_measured') }}>{{ t('muac_green') }}</option>
-                  <option value="yellow" {{ selected('muac','yellow','not_measured') }}>{{ t('muac_yellow') }}</option>
-                  <option value="red" {{ selected('muac','red','not_measured') }}>{{ t('muac_red') }}</option>
-                </select>
-              </div>
-              <div>
-                <label>{{ t('oedema') }}</label>
-                <div class="segmented" role="group">
-                  <input id="oedema_no" type="radio" name="oedema" value="No" {{ checked('oedema','No','No') }}>
-                  <label for="oedema_no">{{ t('no') }}</label>
-                  <input id="oedema_yes" type="radio" name="oedema" value="Yes" {{ checked('oedema','Yes','No') }}>
-                  <label for="oedema_yes">{{ t('yes') }}</label>
-                </div>
-              </div>
-            </div>
-
-            <div id="young_infant" class="card" style="margin-top: 14px;" aria-label="Young infant add-on">
-              <h3>{{ t('young_infant_title') }}</h3>
-              <p class="muted">{{ t('young_infant_hint') }}</p>
-              <div class="row">
-                <div>
-                  <label>{{ t('not_feeding') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="not_feeding_no" type="radio" name="not_feeding" value="No" {{ checked('not_feeding','No','') }}>
-                    <label for="not_feeding_no">{{ t('no') }}</label>
-                    <input id="not_feeding_yes" type="radio" name="not_feeding" value="Yes" {{ checked('not_feeding','Yes','') }}>
-                    <label for="not_feeding_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-                <div>
-                  <label>{{ t('stim_only') }}</label>
-                  <div class="segmented" role="group">
-                    <input id="stim_only_no" type="radio" name="stim_only" value="No" {{ checked('stim_only','No','') }}>
-                    <label for="stim_only_no">{{ t('no') }}</label>
-                    <input id="stim_only_yes" type="radio" name="stim_only" value="Yes" {{ checked('stim_only','Yes','') }}>
-                    <label for="stim_only_yes">{{ t('yes') }}</label>
-                  </div>
-                </div>
-              </div>
-            </div>
-
-            <div class="divider"></div>
-
-            <h3>{{ t('malaria_test') }}</h3>
-            <label for="rdt">{{ t('rdt_result') }}</label>
-            <select id="rdt" name="rdt" required>
-              <option value="not_done" {{ selected('rdt','not_done','not_done') }}>{{ t('rdt_not_done') }}</option>
-              <option value="negative" {{ selected('rdt','negative','not_done') }}>{{ t('rdt_negative') }}</option>
-              <option value="positive" {{ selected('rdt','positive','not_done') }}>{{ t('rdt_positive') }}</option>
-            </select>
-
-            <!-- Bottom-only actions (no sticky tracking) -->
-            <div class="bottom-actions">
-              <div class="btn-row">
-                <button class="btn btn-primary" type="submit">{{ t('get_result') }}</button>
-                <button class="btn btn-secondary" type="reset">{{ t('reset') }}</button>
-              </div>
-            </div>
-          </form>
-        </section>
-      </main>
-
-      <aside>
-        <section class="card" aria-label="Patient list">
-          <h2>{{ t('patient_list') }}</h2>
-          {% if patients|length == 0 %}
-            <p class="muted">{{ t('no_patients') }}</p>
-          {% else %}
-            <table class="table">
-              <thead>
-                <tr>
-                  <th>{{ t('name_nickname') }}</th>
-                  <th>{{ t('village_optional') }}</th>
-                  <th class="nowrap">{{ t('age_group') }}</th>
-                  <th class="nowrap">Actions</th>
-                </tr>
-              </thead>
-              <tbody>
-                {% for p in patients %}
-                  <tr>
-                    <td class="nowrap">
-                      {{ p['name'] }}
-                      {% if selected_patient and selected_patient['id'] == p['id'] %}
-                        <span class="chip" style="margin-left:6px;">Selected</span>
-                      {% endif %}
-                    </td>
-                    <td>{{ p['village'] or "-" }}</td>
-                    <td class="nowrap">{{ p['age_group_label'] }}</td>
-                    <td class="nowrap">
-                      <a class="btn btn-secondary" style="padding:8px 10px; border-radius:12px; min-height:auto; flex:none;"
-                         href="{{ url_for('index', patient_id=p['id'], ar=ar, aa=aa, lang=lang) }}">{{ t('select') }}</a>
-
-                      <form method="post" style="display:inline;" onsubmit="return confirm('Delete this patient and history?');">
-                        <input type="hidden" name="action" value="delete_patient">
-                        <input type="hidden" name="patient_id" value="{{ p['id'] }}">
-                        <input type="hidden" name="lang" value="{{ lang }}">
-                        <input type="hidden" name="ar" value="{{ ar }}">
-                        <input type="hidden" name="aa" value="{{ aa }}">
-                        <button class="btn btn-danger" style="padding:8px 10px; border-radius:12px; min-height:auto; flex:none;" type="submit">{{ t('delete') }}</button>
-                      </form>
-                    </td>
-                  </tr>
-                {% endfor %}
-              </tbody>
-            </table>
-            <div class="hint">{{ t('select_hint') }}</div>
-          {% endif %}
-
-          {% if selected_patient %}
-            <div class="divider"></div>
-            <h3>{{ t('recent_screenings') }}</h3>
-            {% if history|length == 0 %}
-              <p class="muted">{{ t('no_screenings') }}</p>
-            {% else %}
-              <table class="table">
-                <thead>
-                  <tr>
-                    <th class="nowrap">Date</th>
-                    <th>{{ t('high') }}/{{ t('medium') }}/{{ t('low') }}</th>
-                    <th>{{ t('top_conditions') }}</th>
-                    <th class="nowrap">%</th>
-                  </tr>
-                </thead>
-                <tbody>
-                  {% for h in history %}
-                    <tr>
-                      <td class="nowrap">{{ h['created_at'] }}</td>
-                      <td>{{ h['risk'] }}</td>
-                      <td>{{ h['top_condition'] }}</td>
-                      <td class="nowrap">{{ h['certainty'] }}%</td>
-                    </tr>
-                  {% endfor %}
-                </tbody>
-              </table>
-            {% endif %}
-          {% endif %}
-        </section>
-
-        <section class="card" aria-label="Analytics">
-          <h2>{{ t('analytics') }}</h2>
-          <p class="muted">{{ t('analytics_hint') }}</p>
-
-          <form method="get">
-            {% if selected_patient %}
-              <input type="hidden" name="patient_id" value="{{ selected_patient['id'] }}">
-            {% endif %}
-            <input type="hidden" name="lang" value="{{ lang }}">
-            <div class="row">
-              <div>
-                <label for="ar">{{ t('time_range') }}</label>
-                <select id="ar" name="ar">
-                  <option value="7"  {% if ar == '7' %}selected{% endif %}>{{ t('last_7') }}</option>
-                  <option value="30" {% if ar == '30' %}selected{% endif %}>{{ t('last_30') }}</option>
-                  <option value="all" {% if ar == 'all' %}selected{% endif %}>{{ t('all_time') }}</option>
-                </select>
-              </div>
-              <div>
-                <label for="aa">{{ t('assessor_filter') }}</label>
-                <select id="aa" name="aa">
-                  <option value="" {% if aa == '' %}selected{% endif %}>{{ t('all') }}</option>
-                  {% for n in assessor_names %}
-                    <option value="{{ n }}" {% if aa == n %}selected{% endif %}>{{ n }}</option>
-                  {% endfor %}
-                </select>
-              </div>
-            </div>
-            <div class="btn-row" style="margin-top:10px;">
-              <button class="btn btn-secondary" type="submit">{{ t('apply') }}</button>
-              <a class="btn btn-secondary"
-                 href="{{ url_for('index', patient_id=(selected_patient['id'] if selected_patient else None), lang=lang) }}">{{ t('reset_filters') }}</a>
-            </div>
-          </form>
-
-          <div class="divider"></div>
-
-          <div class="pill-row">
-            <span class="pill">{{ t('total') }}: {{ analytics.total }}</span>
-            <span class="pill">{{ t('high') }}: {{ analytics.risk_counts.get('High',0) }}</span>
-            <span class="pill">{{ t('medium') }}: {{ analytics.risk_counts.get('Medium',0) }}</span>
-            <span class="pill">{{ t('low') }}: {{ analytics.risk_counts.get('Low',0) }}</span>
-          </div>
-
-          <h3>{{ t('top_conditions') }}</h3>
-          {% if analytics.top_conditions|length == 0 %}
-            <p class="muted">No data yet.</p>
-          {% else %}
-            <ul>
-              {% for name, cnt, pct in analytics.top_conditions %}
-                <li>
-                  <strong>{{ name }}</strong> — {{ cnt }} ({{ pct }}%)
-                  <div class="mini-bar" aria-hidden="true" style="margin-top:6px;">
-                    <div style="width: {{ pct }}%;"></div>
-                  </div>
-                </li>
-              {% endfor %}
-            </ul>
-          {% endif %}
-
-          <div class="divider"></div>
-
-          <h3>{{ t('common_danger_signs') }}</h3>
-          {% if analytics.danger_signs|length == 0 %}
-            <p class="muted">No data yet.</p>
-          {% else %}
-            <ul>
-              {% for name, cnt in analytics.danger_signs %}
-                <li>{{ name }} — {{ cnt }}</li>
-              {% endfor %}
-            </ul>
-          {% endif %}
-
-          <div class="divider"></div>
-
-          <h3>{{ t('assessor_performance') }}</h3>
-          {% if analytics.assessor_stats|length == 0 %}
-            <p class="muted">No assessor data yet.</p>
-          {% else %}
-            <ul>
-              {% for row in analytics.assessor_stats %}
-                <li>
-                  <strong>{{ row.name }}</strong> — {{ row.total }} screenings, High-risk: {{ row.high }} ({{ row.high_rate }}%)
-                </li>
-              {% endfor %}
-            </ul>
-          {% endif %}
-        </section>
-
-        <section class="card" aria-label="Quick guidance">
-          <h2>{{ t('quick_guidance') }}</h2>
-          <ul>
-            <li>Start with danger signs.</li>
-            <li>Measure breathing rate if possible.</li>
-            <li>Measure MUAC for 6–59 months when available.</li>
-            <li>If unsure, arrange follow-up or refer per local protocol.</li>
-          </ul>
-        </section>
-
-        <section class="card" aria-label="Privacy">
-          <h2>{{ t('privacy') }}</h2>
-          <p class="muted">{{ t('privacy_text') }}</p>
-        </section>
-      </aside>
-    </div>
-  </div>
-
-  <script>
-    function copyShareText() {
-      const el = document.getElementById('shareText');
-      const status = document.getElementById('copyStatus');
-      if (!el) return;
-
-      const text = el.value || el.textContent || "";
-      const done = () => { if (status) status.textContent = "Copied."; };
-      const fail = () => { if (status) status.textContent = "Copy failed. Long-press to copy."; };
-
-      if (navigator.clipboard && navigator.clipboard.writeText) {
-        navigator.clipboard.writeText(text).then(done).catch(fail);
-        return;
-      }
-
-      el.focus();
-      el.select();
-      el.setSelectionRange(0, 999999);
-      try { document.execCommand('copy'); done(); }
-      catch (e) { fail(); }
-      window.getSelection().removeAllRanges();
-    }
+# -------------------- UI --------------------
 
-    function clearRadioGroup(name) {
-      document.querySelectorAll(`input[name="${name}"]`).forEach(i => { i.checked = false; });
-    }
-    function setRadio(name, value) {
-      const el = document.querySelector(`input[name="${name}"][value="${value}"]`);
-      if (el) el.checked = true;
-    }
-    function setGroupDisabled(name, disabled) {
-      document.querySelectorAll(`input[name="${name}"]`).forEach(i => { i.disabled = disabled; });
-    }
+# The page lives in templates/index.html. Flask's loader compiles it once per
+# process and keeps the compiled Template in the Jinja environment cache.
+PAGE_TEMPLATE = "index.html"
+
+# -------------------- Instrumentation --------------------
+
+# Opt-in (TOTO_INSTRUMENT=1). Records wall time per index() phase and per
+# SQL statement, for the current request (Server-Timing header) and per
+# process (/metrics, Prometheus text format). A TOTO_PROFILE_SAMPLE
+# fraction of requests is also run under cProfile, dumped to
+# TOTO_PROFILE_DIR.
+INSTRUMENT = os.environ.get("TOTO_INSTRUMENT") == "1"
+PROFILE_SAMPLE = float(os.environ.get("TOTO_PROFILE_SAMPLE") or 0)
+PROFILE_DIR = os.environ.get("TOTO_PROFILE_DIR", "profiles")
+SLOW_SQL_KEEP = 10
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "phases": {},       # phase -> [calls, seconds]
+    "sql": {},          # statement -> [calls, seconds, slowest call's seconds]
+    "requests": {},     # (endpoint, method, status) -> [calls, seconds]
+}
 
-    function syncYoungInfant() {
-      const age = document.getElementById('age_group');
-      const box = document.getElementById('young_infant');
-      if (!age || !box) return;
+def _sql_key(sql: str) -> str:
+    return " ".join(sql.split())[:200]
+
+def record_sql(sql: str, seconds: float, executed: bool = True, call_seconds: float = None):
+    # executed=False adds fetch time to a statement already counted;
+    # call_seconds is that call's execute + fetch time so far
+    key = _sql_key(sql)
+    with _metrics_lock:
+        stat = _metrics["sql"].setdefault(key, [0, 0.0, 0.0])
+        stat[0] += executed
+        stat[1] += seconds
+        stat[2] = max(stat[2], seconds if call_seconds is None else call_seconds)
+    if has_request_context() and "timings" in g:
+        g.sql_time += seconds
+        g.sql_count += executed
+
+def record_phase(name: str, seconds: float):
+    with _metrics_lock:
+        stat = _metrics["phases"].setdefault(name, [0, 0.0])
+        stat[0] += 1
+        stat[1] += seconds
+    if has_request_context() and "timings" in g:
+        g.timings.append((name, seconds))
+
+@contextlib.contextmanager
+def phase(name: str):
+    if not INSTRUMENT:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
 
-      const show = age.value === '0_2m';
-      box.classList.toggle('hidden', !show);
+class TimedCursor(sqlite3.Cursor):
+    _sql = ""
+    _call_seconds = 0.0
 
-      // Disable so they aren't submitted when not relevant
-      setGroupDisabled('not_feeding', !show);
-      setGroupDisabled('stim_only', !show);
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._call_seconds = time.perf_counter() - start
+            record_sql(sql, self._call_seconds)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._call_seconds = time.perf_counter() - start
+            record_sql(sql, self._call_seconds)
 
-      if (!show) {
-        clearRadioGroup('not_feeding');
-        clearRadioGroup('stim_only');
-        return;
-      }
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            self._call_seconds += seconds
+            record_sql(self._sql, seconds, executed=False, call_seconds=self._call_seconds)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+@app.before_request
+def _start_instrumentation():
+    if not INSTRUMENT:
+        return
+    g.request_start = time.perf_counter()
+    g.timings = []
+    g.sql_time = 0.0
+    g.sql_count = 0
+    if PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE:
+        import cProfile
+
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def _finish_instrumentation(response):
+    if not INSTRUMENT or "timings" not in g:
+        return response
+    total = time.perf_counter() - g.request_start
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = "%s-%s-%dms.prof" % (datetime.now().strftime("%Y%m%d-%H%M%S-%f"), request.endpoint, total * 1000)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+
+    key = (request.endpoint or "unknown", request.method, response.status_code)
+    with _metrics_lock:
+        stat = _metrics["requests"].setdefault(key, [0, 0.0])
+        stat[0] += 1
+        stat[1] += total
+
+    timings = ['%s;dur=%.2f' % (name, seconds * 1000) for name, seconds in g.timings]
+    timings.append('sql;desc="%d queries";dur=%.2f' % (g.sql_count, g.sql_time * 1000))
+    timings.append("total;dur=%.2f" % (total * 1000))
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+def _prom_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_metrics() -> str:
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_prom_label(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value:.6g}" if label_text else f"{name} {value:.6g}")
+
+    with _metrics_lock:
+        phases = sorted(_metrics["phases"].items())
+        sql = sorted(_metrics["sql"].items())
+        requests = sorted(_metrics["requests"].items())
+    with _analytics_cache_lock:
+        cache = dict(analytics_cache_stats)
+
+    metric("toto_requests_total", "counter", "Requests handled.",
+           [({"endpoint": e, "method": m, "status": s}, v[0]) for (e, m, s), v in requests])
+    metric("toto_request_seconds_total", "counter", "Wall time spent in requests.",
+           [({"endpoint": e, "method": m, "status": s}, v[1]) for (e, m, s), v in requests])
+    metric("toto_phase_calls_total", "counter", "Instrumented phases run.",
+           [({"phase": p}, v[0]) for p, v in phases])
+    metric("toto_phase_seconds_total", "counter", "Wall time per instrumented phase.",
+           [({"phase": p}, v[1]) for p, v in phases])
+    metric("toto_sql_statements_total", "counter", "SQL statements executed.",
+           [({"statement": s}, v[0]) for s, v in sql])
+    metric("toto_sql_seconds_total", "counter", "Wall time per SQL statement, including fetches.",
+           [({"statement": s}, v[1]) for s, v in sql])
+    metric("toto_sql_seconds_max", "gauge", "Slowest single call (execute + fetches) per SQL statement.",
+           [({"statement": s}, v[2]) for s, v in sql])
+    slow = sorted(sql, key=lambda item: -item[1][2])[:SLOW_SQL_KEEP]
+    metric("toto_sql_slowest_seconds", "gauge", "Statements with the slowest single call seen by this process.",
+           [({"rank": i + 1, "statement": s}, v[2]) for i, (s, v) in enumerate(slow)])
+    metric("toto_analytics_cache_hits_total", "counter", "Analytics cache hits.", [({}, cache["hits"])])
+    metric("toto_analytics_cache_misses_total", "counter", "Analytics cache misses.", [({}, cache["misses"])])
+    return "\n".join(lines) + "\n"
 
-      // If nothing selected yet, default to "No"
-      if (!document.querySelector('input[name="not_feeding"]:checked')) setRadio('not_feeding', 'No');
-      if (!document.querySelector('input[name="stim_only"]:checked')) setRadio('stim_only', 'No');
-    }
+# -------------------- DB --------------------
 
-    document.addEventListener('DOMContentLoaded', () => {
-      const age = document.getElementById('age_group');
-      if (age) age.addEventListener('change', syncYoungInfant);
-      syncYoungInfant();
-    });
-  </script>
-
-  <!-- Google Translate (client-side, any language) -->
-  <script>
-    function googleTranslateElementInit() {
-      new google.translate.TranslateElement(
-        {
-          pageLanguage: "{{ 'sw' if lang=='sw' else ('hi' if lang=='hi' else 'en') }}",
-          autoDisplay: false
-        },
-        "google_translate_element"
-      );
-    }
-  </script>
-  <script src="https://translate.google.com/translate_a/element.js?cb=googleTranslateElementInit"></script>
-</body>
-</html>
-"""
+# Applied to every connection. WAL lets analytics readers run alongside
+# screening writes; busy_timeout makes writers queue instead of failing
+# with "database is locked" when several workers commit at once.
+DB_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("cache_size", -16000),        # KiB
+    ("mmap_size", 64 * 1024 * 1024),
+]
+
+def connect(path: str = None):
+    conn = sqlite3.connect(path or DB_PATH, timeout=5.0, factory=TimedConnection if INSTRUMENT else sqlite3.Connection)
+    conn.row_factory = sqlite3.Row
+    for name, value in DB_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
 
-# -------------------- DB --------------------
+_thread_conns = threading.local()
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # One connection per worker thread, reused across requests and handed
+    # out once per app context; close_conn() releases it at teardown.
+    if "db" in g:
+        return g.db
+    conns = getattr(_thread_conns, "by_path", None)
+    if conns is None:
+        conns = _thread_conns.by_path = {}
+    conn = conns.get(DB_PATH)
+    if conn is None:
+        conn = conns[DB_PATH] = connect()
+    g.db = conn
     return conn
 
+@app.teardown_appcontext
+def close_conn(exc):
+    conn = g.pop("db", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
 def _has_column(conn, table: str, col: str) -> bool:
     rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
     return any(r["name"] == col for r in rows)
 
-def init_db():
-    conn = get_conn()
+# Schema migrations. Each step runs once, in order, inside its own
+# transaction; PRAGMA user_version records how many have been applied.
+# Steps must tolerate databases created before versioning (user_version 0).
 
+def _migrate_base_tables(conn):
     conn.execute("""
       CREATE TABLE IF NOT EXISTS patients (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1467,14 +381,293 @@ def init_db():
       )
     """)
 
-    # migrations (safe)
     if not _has_column(conn, "screenings", "assessor"):
         conn.execute("ALTER TABLE screenings ADD COLUMN assessor TEXT")
     if not _has_column(conn, "screenings", "raw_answers"):
         conn.execute("ALTER TABLE screenings ADD COLUMN raw_answers TEXT NOT NULL DEFAULT '{}'")
 
-    conn.commit()
-    conn.close()
+def _migrate_answer_columns(conn):
+    # typed answer columns, backfilled once from raw_answers
+    missing = [(col, typ) for col, typ in ANSWER_COLUMNS if not _has_column(conn, "screenings", col)]
+    for col, typ in missing:
+        conn.execute(f"ALTER TABLE screenings ADD COLUMN {col} {typ}")
+    if missing:
+        backfill_answer_columns(conn)
+
+def _migrate_rollup(conn):
+    # analytics rollup: one row per day x assessor x risk x condition
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS analytics_rollup (
+        day TEXT NOT NULL,
+        assessor TEXT NOT NULL,
+        risk TEXT NOT NULL,
+        top_condition TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        ds_drink INTEGER NOT NULL DEFAULT 0,
+        ds_vomit INTEGER NOT NULL DEFAULT 0,
+        ds_convulsions INTEGER NOT NULL DEFAULT 0,
+        ds_lethargy INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, assessor, risk, top_condition)
+      ) WITHOUT ROWID
+    """)
+
+def _migrate_indexes(conn):
+    # indexes for the hot queries (see hot_query_plans)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_screenings_created_at ON screenings(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_screenings_assessor ON screenings(assessor, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_screenings_patient ON screenings(patient_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollup_assessor ON analytics_rollup(assessor, day)")
+
+def _migrate_patient_search(conn):
+    # FTS5 index over patient name/village, kept in sync by triggers.
+    # Builds without FTS5 fall back to LIKE search in patient_page().
+    try:
+        conn.execute("""
+          CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            name, village, content='patients', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+          )
+        """)
+    except sqlite3.OperationalError:
+        return
+    conn.execute("""
+      CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN
+        INSERT INTO patients_fts(rowid, name, village) VALUES (new.id, new.name, new.village);
+      END
+    """)
+    conn.execute("""
+      CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN
+        INSERT INTO patients_fts(patients_fts, rowid, name, village) VALUES ('delete', old.id, old.name, old.village);
+      END
+    """)
+    conn.execute("""
+      CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE ON patients BEGIN
+        INSERT INTO patients_fts(patients_fts, rowid, name, village) VALUES ('delete', old.id, old.name, old.village);
+        INSERT INTO patients_fts(rowid, name, village) VALUES (new.id, new.name, new.village);
+      END
+    """)
+    conn.execute("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')")
+
+def _migrate_condition_codes(conn):
+    # condition code + probability vector; legacy rows get their code from
+    # the (possibly translated) top_condition label they were saved with,
+    # and that label is replaced by the canonical name. Their p_* columns
+    # stay NULL: the probabilities they were scored with were never stored,
+    # and rescoring raw_answers under the current rule table could disagree
+    # with the risk, condition and certainty already on record;
+    # `flask rescore-screenings` recomputes all of them together.
+    for col, typ in CONDITION_COLUMNS:
+        if not _has_column(conn, "screenings", col):
+            conn.execute(f"ALTER TABLE screenings ADD COLUMN {col} {typ}")
+    labels = conn.execute("SELECT DISTINCT top_condition FROM screenings WHERE condition_code IS NULL").fetchall()
+    legacy = legacy_condition_codes()
+    conn.executemany(
+        "UPDATE screenings SET condition_code = ? WHERE condition_code IS NULL AND top_condition = ?",
+        [(legacy.get(r[0], 0), r[0]) for r in labels],
+    )
+    conn.executemany(
+        "UPDATE screenings SET top_condition = ? WHERE condition_code = ? AND top_condition != ?",
+        [(name, code, name) for code, name in CONDITION_NAMES.items()],
+    )
+
+    # the rollup is re-keyed on the code
+    conn.execute("DROP TABLE IF EXISTS analytics_rollup")
+    conn.execute("""
+      CREATE TABLE analytics_rollup (
+        day TEXT NOT NULL,
+        assessor TEXT NOT NULL,
+        risk TEXT NOT NULL,
+        condition_code INTEGER NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        ds_drink INTEGER NOT NULL DEFAULT 0,
+        ds_vomit INTEGER NOT NULL DEFAULT 0,
+        ds_convulsions INTEGER NOT NULL DEFAULT 0,
+        ds_lethargy INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, assessor, risk, condition_code)
+      ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollup_assessor ON analytics_rollup(assessor, day)")
+    _rollup_from_screenings(conn, "true")
+
+def _migrate_change_counter(conn):
+    # single-row change counter bumped by triggers on every data write;
+    # it validates HTTP caches (see conditional_get)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS db_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        change_seq INTEGER NOT NULL,
+        changed_at TEXT NOT NULL
+      )
+    """)
+    conn.execute("INSERT OR IGNORE INTO db_state (id, change_seq, changed_at) VALUES (1, 0, strftime('%Y-%m-%d %H:%M:%S', 'now'))")
+    for table in ("patients", "screenings"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+              CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump AFTER {event} ON {table} BEGIN
+                UPDATE db_state SET change_seq = change_seq + 1,
+                                    changed_at = strftime('%Y-%m-%d %H:%M:%S', 'now') WHERE id = 1;
+              END
+            """)
+
+def _migrate_merge_sources(conn):
+    # Stable per-database device id, plus the bookkeeping a central store
+    # needs to merge device databases (see merge_device_db): the origin
+    # (device, id) of merged rows and a high-water mark per device.
+    if not _has_column(conn, "db_state", "device_id"):
+        conn.execute("ALTER TABLE db_state ADD COLUMN device_id TEXT")
+    conn.execute("UPDATE db_state SET device_id = lower(hex(randomblob(8))) WHERE device_id IS NULL")
+    for table in ("patients", "screenings"):
+        if not _has_column(conn, table, "source_device"):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN source_device TEXT")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
+        conn.execute(f"""
+          CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_source ON {table}(source_device, source_id)
+          WHERE source_device IS NOT NULL
+        """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS merge_sources (
+        device_id TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        patients_hwm INTEGER NOT NULL DEFAULT 0,
+        screenings_hwm INTEGER NOT NULL DEFAULT 0,
+        merged_at TEXT
+      )
+    """)
+
+def _migrate_sync_log(conn):
+    # Change log for device -> hub sync (see build_sync_batch). Only rows
+    # that originate here (source_device IS NULL) are logged, so a hub does
+    # not grow sync_log with every row it applies or merges, and a logged
+    # row's origin is always this device and its id. Local rows that exist
+    # before this step are logged once so the first sync sends them.
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS sync_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL
+      )
+    """)
+    for table in ("patients", "screenings"):
+        for event, op, ref in (("INSERT", "upsert", "new"), ("UPDATE", "upsert", "new"), ("DELETE", "delete", "old")):
+            conn.execute(f"""
+              CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_sync AFTER {event} ON {table}
+              WHEN {ref}.source_device IS NULL BEGIN
+                INSERT INTO sync_log (tbl, row_id, op) VALUES ('{table}', {ref}.id, '{op}');
+              END
+            """)
+        conn.execute(
+            f"INSERT INTO sync_log (tbl, row_id, op) SELECT '{table}', id, 'upsert' FROM {table} "
+            "WHERE source_device IS NULL ORDER BY id"
+        )
+    if not _has_column(conn, "db_state", "sync_checkpoint"):
+        conn.execute("ALTER TABLE db_state ADD COLUMN sync_checkpoint INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS sync_peers (
+        device_id TEXT PRIMARY KEY,
+        applied_seq INTEGER NOT NULL,
+        applied_at TEXT NOT NULL
+      )
+    """)
+
+def _migrate_jobs(conn):
+    # Persistent queue for the background worker (see run_next_job; running
+    # jobs carry their worker's owner token and a heartbeat), and the rollup
+    # high-water mark: the rollup covers screenings up to rollup_hwm, newer
+    # ones are folded in by a job.
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}',
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        owner TEXT,
+        heartbeat_at TEXT
+      )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+    if not _has_column(conn, "db_state", "rollup_hwm"):
+        conn.execute("ALTER TABLE db_state ADD COLUMN rollup_hwm INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE db_state SET rollup_hwm = (SELECT COALESCE(MAX(id), 0) FROM screenings) WHERE id = 1")
+
+MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_answer_columns,
+    _migrate_rollup,
+    _migrate_indexes,
+    _migrate_patient_search,
+    _migrate_condition_codes,
+    _migrate_change_counter,
+    _migrate_merge_sources,
+    _migrate_sync_log,
+    _migrate_jobs,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn) -> int:
+    applied = 0
+    while schema_version(conn) < SCHEMA_VERSION:
+        # BEGIN IMMEDIATE serialises workers racing to migrate the same file
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(conn)
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                applied += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def init_db():
+    global _schema_ready
+    with _schema_lock:
+        conn = connect()
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+        _schema_ready = True
+
+@app.before_request
+def _ensure_schema():
+    if not _schema_ready:
+        with phase("init_db"):
+            init_db()
+        notify_jobs()
+
+def data_state(conn):
+    row = conn.execute("SELECT change_seq, changed_at FROM db_state WHERE id = 1").fetchone()
+    changed_at = datetime.strptime(row["changed_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return row["change_seq"], changed_at
+
+def backfill_answer_columns(conn):
+    rows = conn.execute("SELECT id, raw_answers FROM screenings").fetchall()
+    updates = []
+    for r in rows:
+        try:
+            a = json.loads(r["raw_answers"] or "{}")
+        except Exception:
+            a = {}
+        if not isinstance(a, dict):
+            a = {}
+        updates.append(answer_column_values(parse_answers(a)) + (r["id"],))
+    set_sql = ", ".join(f"{col} = ?" for col, _ in ANSWER_COLUMNS)
+    conn.executemany(f"UPDATE screenings SET {set_sql} WHERE id = ?", updates)
 
 # -------------------- Helpers --------------------
 
@@ -1498,114 +691,207 @@ def make_whatsapp_link(message: str, phone_digits: str = "") -> str:
         return f"https://wa.me/{phone_digits}?text={encoded}"
     return f"https://wa.me/?text={encoded}"
 
-# -------------------- Screening logic --------------------
+# -------------------- Answers --------------------
+
+# typed screenings columns mirroring parse_answers()
+ANSWER_COLUMNS = [
+    ("age_group", "TEXT"),
+    ("ds_drink", "INTEGER"),
+    ("ds_vomit", "INTEGER"),
+    ("ds_convulsions", "INTEGER"),
+    ("ds_lethargy", "INTEGER"),
+    ("fever", "INTEGER"),
+    ("cough", "INTEGER"),
+    ("rr", "INTEGER"),
+    ("chest_indrawing", "INTEGER"),
+    ("stridor", "INTEGER"),
+    ("muac", "TEXT"),
+    ("oedema", "INTEGER"),
+    ("not_feeding", "INTEGER"),
+    ("stim_only", "INTEGER"),
+    ("rdt", "TEXT"),
+]
+
+def _answer_choice(a: dict, key: str, default: str) -> str:
+    # JSON clients can send any type; anything but a string counts as unanswered
+    value = a.get(key, default)
+    return value if isinstance(value, str) else default
+
+def parse_answers(a: dict) -> dict:
+    rr = a.get("rr")
+    return {
+        "age_group": _answer_choice(a, "age_group", "1_5y"),
+        "ds_drink": a.get("ds_drink", "No") == "Yes",
+        "ds_vomit": a.get("ds_vomit", "No") == "Yes",
+        "ds_convulsions": a.get("ds_convulsions", "No") == "Yes",
+        "ds_lethargy": a.get("ds_lethargy", "No") == "Yes",
+        "fever": a.get("fever", "No") == "Yes",
+        "cough": a.get("cough_breath", "No") == "Yes",
+        "rr": int(rr) if rr and str(rr).strip().isdecimal() else None,
+        "chest_indrawing": a.get("chest_indrawing", "No") == "Yes",
+        "stridor": a.get("stridor", "No") == "Yes",
+        "muac": _answer_choice(a, "muac", "not_measured"),
+        "oedema": a.get("oedema", "No") == "Yes",
+        "not_feeding": a.get("not_feeding", "No") == "Yes",
+        "stim_only": a.get("stim_only", "No") == "Yes",
+        "rdt": _answer_choice(a, "rdt", "not_done"),
+    }
 
-def compute_result(a: dict, lang: str, selected_patient=None):
-    t = make_t(lang)
+# condition code and the probability of each condition, in CONDITION_CODES order
+PROB_COLUMNS = {
+    "Pneumonia": "p_pneumonia",
+    "Malaria": "p_malaria",
+    "Malnutrition": "p_malnutrition",
+    "Neonatal complications": "p_neonatal",
+}
+CONDITION_COLUMNS = [("condition_code", "INTEGER")] + [(col, "REAL") for col in PROB_COLUMNS.values()]
+
+def answer_column_values(p: dict) -> tuple:
+    return tuple(int(p[col]) if isinstance(p[col], bool) else p[col] for col, _ in ANSWER_COLUMNS)
+
+# -------------------- Scoring rules --------------------
+
+# Scores and high-risk triggers come from a declarative rule table
+# (scoring_rules.json), compiled once at import:
+#   scores:    {"when": {field: value | [values]}, "add": {condition: delta}}
+#   high_risk: {"name": ..., "any": [when, ...]}
+# Fields are parse_answers() keys plus the derived "danger" (any danger
+# sign) and "fast_breathing" (rr at or above fast_breathing_rr[age_group]).
+SCORING_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_rules.json")
+
+RULE_FIELDS = [
+    "age_group", "ds_drink", "ds_vomit", "ds_convulsions", "ds_lethargy", "danger",
+    "fever", "cough", "fast_breathing", "chest_indrawing", "stridor",
+    "muac", "oedema", "not_feeding", "stim_only", "rdt",
+]
+
+def _compile_when(when: dict, fields: list) -> tuple:
+    if not isinstance(when, dict) or not when:
+        raise ValueError(f"Rule condition must be a non-empty object: {when!r}")
+    pred = []
+    for field, value in when.items():
+        if field not in RULE_FIELDS:
+            raise ValueError(f"Unknown rule field: {field!r}")
+        if field not in fields:
+            fields.append(field)
+        pred.append((field, frozenset(value if isinstance(value, list) else [value])))
+    return tuple(pred)
+
+def compile_rules(spec: dict) -> dict:
+    conditions = list(spec["conditions"])
+    unknown = set(conditions) - set(CONDITION_CODES)
+    if unknown:
+        raise ValueError(f"Conditions without a CONDITION_CODES entry: {sorted(unknown)}")
+    fields = []
+    score_rules = []
+    for rule in spec.get("scores", []):
+        when = _compile_when(rule["when"], fields)
+        unknown = set(rule["add"]) - set(conditions)
+        if unknown:
+            raise ValueError(f"Unknown condition(s) in rule: {sorted(unknown)}")
+        score_rules.append((when, tuple((conditions.index(c), float(d)) for c, d in rule["add"].items())))
+    trigger_rules = [(rule["name"], [_compile_when(w, fields) for w in rule["any"]]) for rule in spec.get("high_risk", [])]
+
+    # The state tuple holds only the fields some rule reads, in RULE_FIELDS
+    # order; evaluation is memoised on it, so per-answer cost does not grow
+    # with the number of rules.
+    fields = [f for f in RULE_FIELDS if f in fields]
+    pos = {f: i for i, f in enumerate(fields)}
+    score_rules = [(tuple((pos[f], v) for f, v in when), deltas) for when, deltas in score_rules]
+    trigger_rules = [(name, [tuple((pos[f], v) for f, v in w) for w in any_of]) for name, any_of in trigger_rules]
+
+    @functools.lru_cache(maxsize=65536)
+    def evaluate(state: tuple):
+        scores = [0.0] * len(conditions)
+        for when, deltas in score_rules:
+            if all(state[i] in values for i, values in when):
+                for j, delta in deltas:
+                    scores[j] += delta
+        triggers = tuple(
+            name for name, any_of in trigger_rules
+            if any(all(state[i] in values for i, values in w) for w in any_of)
+        )
+        return tuple(scores), triggers
 
-    wa_caregiver = digits_only(a.get("wa_caregiver", ""))
-    wa_supervisor = digits_only(a.get("wa_supervisor", ""))
+    return {
+        "conditions": conditions,
+        "fields": fields,
+        "fast_breathing_rr": dict(spec.get("fast_breathing_rr", {})),
+        "medium_certainty": int(spec.get("medium_certainty", 80)),
+        "evaluate": evaluate,
+    }
 
-    include_name = (a.get("include_name", "No") == "Yes")
-    include_village = (a.get("include_village", "No") == "Yes")
-    assessor = (a.get("assessor") or "").strip()
+def load_scoring_rules(path: str = SCORING_RULES_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return compile_rules(json.load(f))
+
+SCORING_RULES = load_scoring_rules()
+CONDITIONS = SCORING_RULES["conditions"]
+
+def answer_state(p: dict, rules: dict = None) -> tuple:
+    rules = rules or SCORING_RULES
+    state = []
+    for field in rules["fields"]:
+        if field == "danger":
+            state.append(p["ds_drink"] or p["ds_vomit"] or p["ds_convulsions"] or p["ds_lethargy"])
+        elif field == "fast_breathing":
+            threshold = rules["fast_breathing_rr"].get(p["age_group"])
+            state.append(p["rr"] is not None and threshold is not None and p["rr"] >= threshold)
+        else:
+            state.append(p[field])
+    return tuple(state)
+
+def score_answers(p: dict, rules: dict = None):
+    rules = rules or SCORING_RULES
+    scores, triggers = rules["evaluate"](answer_state(p, rules))
+    return dict(zip(rules["conditions"], scores)), list(triggers)
+
+def risk_level(high: bool, certainty: int) -> str:
+    if high:
+        return "High"
+    if certainty >= SCORING_RULES["medium_certainty"]:
+        return "Medium"
+    return "Low"
 
-    danger = any(a.get(k, "No") == "Yes" for k in ["ds_drink", "ds_vomit", "ds_convulsions", "ds_lethargy"])
+# -------------------- Screening logic --------------------
 
-    age = a.get("age_group", "1_5y")
-    fever = (a.get("fever", "No") == "Yes")
-    cough = (a.get("cough_breath", "No") == "Yes")
+def score_parsed(p: dict):
+    # (risk, ranked); ranked: [(condition, probability), ...] most likely first
+    scores, high_triggers = score_answers(p)
 
-    rr = a.get("rr")
-    rr = int(rr) if rr and str(rr).strip().isdigit() else None
+    probs = softmax(scores)
+    ranked = sorted(probs.items(), key=lambda x: x[1], reverse=True)
 
-    chest_indrawing = (a.get("chest_indrawing", "No") == "Yes")
-    stridor = (a.get("stridor", "No") == "Yes")
+    certainty = int(round(ranked[0][1] * 100))
+    return risk_level(bool(high_triggers), certainty), ranked
 
-    muac = a.get("muac", "not_measured")
-    oedema = (a.get("oedema", "No") == "Yes")
+def compute_result(a: dict, lang: str, selected_patient=None):
+    p = parse_answers(a)
+    risk, ranked = score_parsed(p)
+    return build_result(a, p, lang, selected_patient, ranked, risk)
 
-    not_feeding = (a.get("not_feeding", "No") == "Yes")
-    stim_only = (a.get("stim_only", "No") == "Yes")
+def build_result(a: dict, p: dict, lang: str, selected_patient, ranked: list, risk: str):
+    # ranked: [(condition, probability), ...] most likely first
+    t = make_t(lang)
 
-    rdt = a.get("rdt", "not_done")
+    wa_caregiver = digits_only(_answer_choice(a, "wa_caregiver", ""))
+    wa_supervisor = digits_only(_answer_choice(a, "wa_supervisor", ""))
 
-    scores = {
-        "Pneumonia": 0.0,
-        "Malaria": 0.0,
-        "Malnutrition": 0.0,
-        "Neonatal complications": 0.0,
-    }
+    include_name = (a.get("include_name", "No") == "Yes")
+    include_village = (a.get("include_village", "No") == "Yes")
+    assessor = _answer_choice(a, "assessor", "").strip()
 
-    if age == "0_2m":
-        scores["Neonatal complications"] += 2.0
-
-    if fever:
-        scores["Malaria"] += 2.5
-        if age == "0_2m":
-            scores["Neonatal complications"] += 2.0
-
-    if cough:
-        scores["Pneumonia"] += 2.5
-
-    fast_breathing = False
-    if rr is not None:
-        if age == "2_12m" and rr >= 50: fast_breathing = True
-        if age == "1_5y" and rr >= 40: fast_breathing = True
-        if age == "0_2m" and rr >= 60: fast_breathing = True
-
-    if fast_breathing:
-        scores["Pneumonia"] += 3.0
-        if age == "0_2m":
-            scores["Neonatal complications"] += 2.5
-
-    if chest_indrawing:
-        scores["Pneumonia"] += 2.5
-        if age == "0_2m":
-            scores["Neonatal complications"] += 2.0
-
-    if stridor:
-        scores["Pneumonia"] += 2.0
-
-    if rdt == "positive":
-        scores["Malaria"] += 6.0
-    elif rdt == "negative":
-        scores["Malaria"] -= 3.0
-
-    if oedema:
-        scores["Malnutrition"] += 7.0
-    if muac == "red":
-        scores["Malnutrition"] += 6.0
-    elif muac == "yellow":
-        scores["Malnutrition"] += 3.0
-
-    if age == "0_2m":
-        if not_feeding: scores["Neonatal complications"] += 3.5
-        if stim_only: scores["Neonatal complications"] += 3.5
-
-    high_triggers = []
-    if danger: high_triggers.append("danger")
-    if oedema or muac == "red": high_triggers.append("sam")
-    if (cough and (chest_indrawing or stridor)) or (cough and fast_breathing and age == "0_2m"): high_triggers.append("breathing")
-    if age == "0_2m" and (not_feeding or stim_only or fast_breathing or chest_indrawing or fever): high_triggers.append("young_infant")
+    danger = p["ds_drink"] or p["ds_vomit"] or p["ds_convulsions"] or p["ds_lethargy"]
+    muac = p["muac"]
+    oedema = p["oedema"]
+    rdt = p["rdt"]
 
-    probs = softmax(scores)
-    sorted_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-    top_name, top_p = sorted_probs[0]
+    top_name, top_p = ranked[0]
     certainty = int(round(top_p * 100))
-
-    alt = [(condition_label(lang, n), int(round(p * 100))) for n, p in sorted_probs[1:3]]
+    alt = [(condition_label(lang, n), int(round(prob * 100))) for n, prob in ranked[1:3]]
     top_label = condition_label(lang, top_name)
 
-    if high_triggers:
-        risk = "High"
-        box_class = "danger"
-    elif certainty >= 80:
-        risk = "Medium"
-        box_class = "warn"
-    else:
-        risk = "Low"
-        box_class = "ok"
+    box_class = {"High": "danger", "Medium": "warn", "Low": "ok"}[risk]
 
     actions = []
     tips = []
@@ -1660,6 +946,9 @@ def compute_result(a: dict, lang: str, selected_patient=None):
 
     return {
         "risk": risk,
+        "condition": top_name,
+        "condition_code": CONDITION_CODES[top_name],
+        "probabilities": dict(ranked),
         "top_condition": top_label,
         "top_condition_label": top_label,
         "certainty": certainty,
@@ -1672,76 +961,365 @@ def compute_result(a: dict, lang: str, selected_patient=None):
         "wa_supervisor_url": make_whatsapp_link(share_message, wa_supervisor),
         "assessor": assessor,
         "raw_answers": a,
+        "answers": p,
     }
 
+# -------------------- Batch scoring --------------------
+
+def score_batch(parsed: list) -> list:
+    # Same output as [score_parsed(p) ...]. Scores depend only on the answer
+    # state, and a batch has few distinct states, so each is scored once.
+    scored = {}
+    out = []
+    for p in parsed:
+        state = answer_state(p)
+        if state not in scored:
+            scored[state] = score_parsed(p)
+        out.append(scored[state])
+    return out
+
+def compute_results_batch(answers: list, lang: str, selected_patients=None) -> list:
+    # Same output as [compute_result(a, lang, sp) ...], for bulk inserts that
+    # store the messages; rescoring stored rows only needs score_batch().
+    selected_patients = selected_patients or [None] * len(answers)
+    parsed = [parse_answers(a) for a in answers]
+    return [
+        build_result(a, p, lang, sp, ranked, risk)
+        for a, p, sp, (risk, ranked) in zip(answers, parsed, selected_patients, score_batch(parsed))
+    ]
+
+# -------------------- Screenings --------------------
+
+# top_condition keeps the canonical (English) name; labels are applied at render time
+SCREENING_INSERT_SQL = """INSERT INTO screenings
+   (patient_id, created_at, risk, top_condition, certainty, share_message, raw_answers, assessor, {cols})
+   VALUES (?,?,?,?,?,?,?,?,{marks})""".format(
+    cols=", ".join(col for col, _ in ANSWER_COLUMNS + CONDITION_COLUMNS),
+    marks=",".join("?" * len(ANSWER_COLUMNS + CONDITION_COLUMNS)),
+)
+
+def screening_row(patient_id, created_at: str, result: dict) -> tuple:
+    return (
+        patient_id,
+        created_at,
+        result["risk"],
+        result["condition"],
+        int(result["certainty"]),
+        result["share_message"],
+        json.dumps(result["raw_answers"], ensure_ascii=False),
+        result["assessor"],
+        *answer_column_values(result["answers"]),
+        result["condition_code"],
+        *(result["probabilities"][name] for name in PROB_COLUMNS),
+    )
+
+MAX_BULK_SCREENINGS = 1000
+
+def _normalize_timestamp(s):
+    # Stored as zero-padded "YYYY-MM-DD HH:MM": windows and Parquet partitions
+    # compare and slice created_at as a string. None if s is not a timestamp.
+    try:
+        return datetime.strptime(s, "%Y-%m-%d %H:%M").strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return None
+
+def insert_screenings_bulk(conn, items: list, lang: str) -> list:
+    # Scores every item, then inserts the valid ones with a single
+    # executemany and folds them into the rollup in the same transaction.
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    results = []
+    valid = []   # (position in results, patient id, created_at, answers)
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({"index": i, "ok": False, "error": "Screening must be an object."})
+            continue
+        answers = dict(item)
+        pid = answers.pop("patient_id", None)
+        created_at = answers.pop("created_at", None) or now
+        if pid in (None, ""):
+            pid = None
+        elif str(pid).isdecimal():
+            pid = int(pid)
+        else:
+            results.append({"index": i, "ok": False, "error": "Unknown patient id."})
+            continue
+        created_at = _normalize_timestamp(created_at)
+        if created_at is None:
+            results.append({"index": i, "ok": False, "error": "created_at must be YYYY-MM-DD HH:MM."})
+            continue
+
+        valid.append((len(results), pid, created_at, answers))
+        results.append({"index": i, "ok": True})
+
+    # one lookup for every patient referenced by a well-formed item
+    pids = sorted({pid for _, pid, _, _ in valid if pid is not None})
+    patients = {}
+    if pids:
+        rows = conn.execute(
+            "SELECT * FROM patients WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(pids),)
+        ).fetchall()
+        patients = {r["id"]: dict(r) for r in rows}
+    known = []
+    for entry in valid:
+        pos, pid = entry[0], entry[1]
+        if pid is not None and pid not in patients:
+            results[pos].update(ok=False, error="Unknown patient id.")
+        else:
+            known.append(entry)
+    valid = known
+
+    if not valid:
+        return results
+
+    scored = compute_results_batch(
+        [answers for *_, answers in valid], lang, [patients.get(pid) for _, pid, _, _ in valid]
+    )
+    to_insert = []
+    for (pos, pid, created_at, _), result in zip(valid, scored):
+        to_insert.append((pos, screening_row(pid, created_at, result)))
+        results[pos].update(
+            risk=result["risk"],
+            top_condition=result["top_condition"],
+            condition_code=result["condition_code"],
+            certainty=result["certainty"],
+            share_message=result["share_message"],
+        )
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM screenings").fetchone()[0]
+        conn.executemany(SCREENING_INSERT_SQL, [row for _, row in to_insert])
+        new_ids = [r[0] for r in conn.execute("SELECT id FROM screenings WHERE id > ? ORDER BY id", (last_id,))]
+        enqueue_job(conn, "fold_rollup", coalesce=True)
+        conn.commit()
+        invalidate_analytics_cache()
+    except Exception:
+        conn.rollback()
+        raise
+    notify_jobs(conn)
+
+    for (pos, _), new_id in zip(to_insert, new_ids):
+        results[pos]["id"] = new_id
+    return results
+
+RESCORE_CHUNK = 5000
+
+def stored_answers(row) -> dict:
+    # parse_answers() output rebuilt from the typed answer columns
+    defaults = parse_answers({})
+    p = {}
+    for col, typ in ANSWER_COLUMNS:
+        value = row[col]
+        if value is None:
+            p[col] = defaults[col]
+        else:
+            p[col] = value if typ == "TEXT" or col == "rr" else bool(value)
+    return p
+
+def rescore_screenings(conn, chunk: int = RESCORE_CHUNK) -> int:
+    # Re-scores stored screenings from their typed answers under the current
+    # rule table and updates risk, condition, certainty and p_* where they
+    # changed; legacy rows get the p_* they never had. Share messages stay as
+    # they were sent. Returns the number of rows changed.
+    prob_cols = list(PROB_COLUMNS.values())
+    cols = ", ".join(["id", "risk", "condition_code", "certainty"] + prob_cols + [c for c, _ in ANSWER_COLUMNS])
+    set_sql = ", ".join(f"{c} = ?" for c in ["risk", "top_condition", "condition_code", "certainty"] + prob_cols)
+    rolled_where = f"id IN (SELECT value FROM json_each(?)) AND id <= {ROLLUP_HWM_SQL}"
+    changed, last_id = 0, 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT {cols} FROM screenings WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)
+            ).fetchall()
+            if not rows:
+                conn.commit()
+                break
+            last_id = rows[-1]["id"]
+            updates = []
+            for row, (risk, ranked) in zip(rows, score_batch([stored_answers(r) for r in rows])):
+                condition, top_p = ranked[0]
+                probs = dict(ranked)
+                new = (risk, CONDITION_CODES[condition], int(round(top_p * 100)), *(probs[n] for n in PROB_COLUMNS))
+                if new != (row["risk"], row["condition_code"], row["certainty"], *(row[c] for c in prob_cols)):
+                    updates.append((risk, condition, *new[1:], row["id"]))
+            if updates:
+                ids = json.dumps([u[-1] for u in updates])
+                _rollup_from_screenings(conn, rolled_where, (ids,), sign=-1)
+                conn.executemany(f"UPDATE screenings SET {set_sql} WHERE id = ?", updates)
+                _rollup_from_screenings(conn, rolled_where, (ids,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        changed += len(updates)
+    if changed:
+        invalidate_analytics_cache()
+    return changed
+
 # -------------------- Analytics --------------------
 
-def compute_analytics(conn, ar: str, aa: str):
-    where = []
-    params = []
+DANGER_SIGN_KEYS = [
+    ("ds_drink", "Not able to drink/breastfeed"),
+    ("ds_vomit", "Vomits everything"),
+    ("ds_convulsions", "Convulsions"),
+    ("ds_lethargy", "Very sleepy/unconscious"),
+]
+
+_ROLLUP_SELECT = """
+    SELECT substr(created_at, 1, 10) AS day, COALESCE(TRIM(assessor), '') AS assessor, risk,
+           COALESCE(condition_code, 0) AS condition_code,
+           COUNT(*) AS n, SUM(ds_drink) AS d1, SUM(ds_vomit) AS d2, SUM(ds_convulsions) AS d3,
+           SUM(ds_lethargy) AS d4
+    FROM screenings
+"""
+
+def _rollup_from_screenings(conn, where: str, params=(), sign: int = 1):
+    # Folds the matching screenings into (sign=1) or out of (sign=-1) the rollup.
+    conn.execute(
+        f"""INSERT INTO analytics_rollup
+            (day, assessor, risk, condition_code, n, ds_drink, ds_vomit, ds_convulsions, ds_lethargy)
+            SELECT day, assessor, risk, condition_code, {sign} * n, {sign} * d1, {sign} * d2, {sign} * d3, {sign} * d4
+            FROM ({_ROLLUP_SELECT} WHERE {where} GROUP BY 1, 2, 3, 4)
+            WHERE true
+            ON CONFLICT(day, assessor, risk, condition_code) DO UPDATE SET
+              n = n + excluded.n,
+              ds_drink = ds_drink + excluded.ds_drink,
+              ds_vomit = ds_vomit + excluded.ds_vomit,
+              ds_convulsions = ds_convulsions + excluded.ds_convulsions,
+              ds_lethargy = ds_lethargy + excluded.ds_lethargy""",
+        params,
+    )
+    if sign < 0:
+        conn.execute("DELETE FROM analytics_rollup WHERE n <= 0")
+
+# The rollup holds exactly the screenings with id <= db_state.rollup_hwm.
+# New screenings are folded in by a "fold_rollup" job; until then the
+# analytics queries read them from screenings (the "tail").
+ROLLUP_HWM_SQL = "(SELECT rollup_hwm FROM db_state WHERE id = 1)"
+
+def fold_rollup(conn) -> int:
+    # Call inside a write transaction.
+    hwm = conn.execute(f"SELECT {ROLLUP_HWM_SQL}").fetchone()[0]
+    top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM screenings").fetchone()[0]
+    if top > hwm:
+        _rollup_from_screenings(conn, "id > ? AND id <= ?", (hwm, top))
+        conn.execute("UPDATE db_state SET rollup_hwm = ? WHERE id = 1", (top,))
+    return max(top - hwm, 0)
+
+def rollup_remove_patient(conn, patient_id: int):
+    _rollup_from_screenings(conn, f"patient_id = ? AND id <= {ROLLUP_HWM_SQL}", (patient_id,), sign=-1)
+
+def rebuild_rollups(conn):
+    conn.execute("DELETE FROM analytics_rollup")
+    conn.execute("UPDATE db_state SET rollup_hwm = 0 WHERE id = 1")
+    fold_rollup(conn)
+
+def _analytics_queries(ar: str, aa: str) -> list:
+    # Whole days come from the rollup; the partial first day of a 7/30-day
+    # window is read from screenings so the cut-off stays minute-exact, as
+    # are whole-day screenings not yet folded into the rollup.
+    rollup_where = []
+    rollup_params = []
+    partial = None
 
     if ar in ("7", "30"):
-        days = int(ar)
-        start = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M")
-        where.append("created_at >= ?")
-        params.append(start)
+        start_dt = datetime.now() - timedelta(days=int(ar))
+        start_day = start_dt.strftime("%Y-%m-%d")
+        rollup_where.append("day > ?")
+        rollup_params.append(start_day)
+        partial = (
+            start_dt.strftime("%Y-%m-%d %H:%M"),
+            (start_dt + timedelta(days=1)).strftime("%Y-%m-%d"),
+        )
 
     if aa:
-        where.append("assessor = ?")
+        rollup_where.append("assessor = ?")
+        rollup_params.append(aa)
+
+    sql = """SELECT assessor, risk, condition_code, SUM(n), SUM(ds_drink), SUM(ds_vomit),
+                    SUM(ds_convulsions), SUM(ds_lethargy)
+             FROM analytics_rollup"""
+    if rollup_where:
+        sql += " WHERE " + " AND ".join(rollup_where)
+    sql += " GROUP BY assessor, risk, condition_code"
+    queries = [(sql, rollup_params)]
+
+    if partial:
+        sql = _ROLLUP_SELECT + " WHERE created_at >= ? AND created_at < ?"
+        params = list(partial)
+        if aa:
+            sql += " AND assessor = ?"
+            params.append(aa)
+        sql += " GROUP BY 1, 2, 3, 4"
+        queries.append((sql, params))
+
+    sql = _ROLLUP_SELECT + f" WHERE id > {ROLLUP_HWM_SQL}"
+    params = []
+    if partial:
+        sql += " AND created_at >= ?"
+        params.append(partial[1])
+    if aa:
+        sql += " AND assessor = ?"
         params.append(aa)
+    sql += " GROUP BY 1, 2, 3, 4"
+    queries.append((sql, params))
+
+    return queries
+
+def _analytics_groups(conn, ar: str, aa: str):
+    # One read transaction: a fold committed between the rollup and tail
+    # reads would otherwise drop the folded rows from both.
+    rollup_query, *screening_queries = _analytics_queries(ar, aa)
+    own_txn = not conn.in_transaction
+    if own_txn:
+        conn.execute("BEGIN")
+    try:
+        groups = [tuple(r) for r in conn.execute(*rollup_query).fetchall()]
+        for sql, params in screening_queries:
+            groups += [tuple(r)[1:] for r in conn.execute(sql, params).fetchall()]
+    finally:
+        if own_txn:
+            conn.commit()
+    return groups
 
-    sql = "SELECT risk, top_condition, raw_answers, assessor FROM screenings"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-
-    rows = conn.execute(sql, params).fetchall()
+def compute_analytics(conn, ar: str, aa: str, lang: str = "en"):
+    return analytics_from_groups(_analytics_groups(conn, ar, aa), lang)
 
-    total = len(rows)
+def analytics_from_groups(groups, lang: str = "en"):
+    # groups: (assessor, risk, condition_code, n, *danger sign counts);
+    # the same key may appear more than once
+    total = 0
     risk_counts = {"High": 0, "Medium": 0, "Low": 0}
     cond_counts = {}
-    danger_counts = {
-        "Not able to drink/breastfeed": 0,
-        "Vomits everything": 0,
-        "Convulsions": 0,
-        "Very sleepy/unconscious": 0,
-    }
+    danger_counts = {label: 0 for _, label in DANGER_SIGN_KEYS}
     assessor_rollup = {}
 
-    for r in rows:
-        risk = r["risk"]
-        risk_counts[risk] = risk_counts.get(risk, 0) + 1
-
-        cond = r["top_condition"]
-        cond_counts[cond] = cond_counts.get(cond, 0) + 1
+    for assessor, risk, code, n, *flags in groups:
+        total += n
+        risk_counts[risk] = risk_counts.get(risk, 0) + n
+        cond_counts[code] = cond_counts.get(code, 0) + n
 
-        assessor = (r["assessor"] or "").strip()
         if assessor:
             assessor_rollup.setdefault(assessor, {"total": 0, "high": 0})
-            assessor_rollup[assessor]["total"] += 1
+            assessor_rollup[assessor]["total"] += n
             if risk == "High":
-                assessor_rollup[assessor]["high"] += 1
+                assessor_rollup[assessor]["high"] += n
 
-        try:
-            a = json.loads(r["raw_answers"] or "{}")
-        except Exception:
-            a = {}
-
-        if a.get("ds_drink") == "Yes": danger_counts["Not able to drink/breastfeed"] += 1
-        if a.get("ds_vomit") == "Yes": danger_counts["Vomits everything"] += 1
-        if a.get("ds_convulsions") == "Yes": danger_counts["Convulsions"] += 1
-        if a.get("ds_lethargy") == "Yes": danger_counts["Very sleepy/unconscious"] += 1
+        for (_, label), cnt in zip(DANGER_SIGN_KEYS, flags):
+            danger_counts[label] += cnt
 
-    top_conditions = sorted(cond_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+    top_conditions = sorted(cond_counts.items(), key=lambda x: (-x[1], x[0]))[:3]
     top_conditions_fmt = []
-    for name, cnt in top_conditions:
+    for code, cnt in top_conditions:
         pct = int(round((cnt / total) * 100)) if total else 0
-        top_conditions_fmt.append((name, cnt, pct))
+        top_conditions_fmt.append((condition_code_label(lang, code), cnt, pct))
 
     danger_sorted = sorted(danger_counts.items(), key=lambda x: x[1], reverse=True)
     danger_sorted = [(k, v) for k, v in danger_sorted if v > 0][:4]
 
     assessor_stats = []
-    for name, d in sorted(assessor_rollup.items(), key=lambda x: x[1]["total"], reverse=True):
+    for name, d in sorted(assessor_rollup.items(), key=lambda x: (-x[1]["total"], x[0])):
         total_a = d["total"]
         high_a = d["high"]
         rate = int(round((high_a / total_a) * 100)) if total_a else 0
@@ -1755,147 +1333,1440 @@ def compute_analytics(conn, ar: str, aa: str):
         "assessor_stats": assessor_stats,
     }
 
-# -------------------- Routes --------------------
+# Results are cached per (ar, aa, lang) and validated against the data
+# change counter and the rollup high-water mark, so writes and folds from
+# other threads, workers or the CLI are never served stale. 7/30-day
+# windows are minute-exact and expire at the next minute boundary.
+ANALYTICS_CACHE_SIZE = 64
+_analytics_cache = OrderedDict()
+_analytics_cache_lock = threading.Lock()
+analytics_cache_stats = {"hits": 0, "misses": 0}
+
+def invalidate_analytics_cache():
+    with _analytics_cache_lock:
+        _analytics_cache.clear()
+
+def cached_analytics(conn, ar: str, aa: str, lang: str = "en"):
+    key = (ar, aa, lang)
+    seq, _ = data_state(conn)
+    state = (seq, conn.execute(f"SELECT {ROLLUP_HWM_SQL}").fetchone()[0])
+    now = datetime.now()
+    with _analytics_cache_lock:
+        entry = _analytics_cache.get(key)
+        if entry and entry[0] == state and (entry[1] is None or now < entry[1]):
+            _analytics_cache.move_to_end(key)
+            analytics_cache_stats["hits"] += 1
+            return entry[2]
+        analytics_cache_stats["misses"] += 1
+
+    analytics = compute_analytics(conn, ar, aa, lang)
+    expires = None
+    if ar in ("7", "30"):
+        expires = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    with _analytics_cache_lock:
+        _analytics_cache[key] = (state, expires, analytics)
+        _analytics_cache.move_to_end(key)
+        while len(_analytics_cache) > ANALYTICS_CACHE_SIZE:
+            _analytics_cache.popitem(last=False)
+    return analytics
 
-@app.route("/", methods=["GET", "POST"])
-def index():
-    init_db()
+# -------------------- Patients --------------------
 
-    lang = (request.args.get("lang") or request.form.get("lang") or "en").strip().lower()
-    if lang not in TRANSLATIONS:
-        lang = "en"
-    t = make_t(lang)
+PATIENT_PAGE_SIZE = 25
 
-    patient_id = (request.args.get("patient_id") or "").strip()
+PATIENT_PAGE_SQL = "SELECT * FROM patients WHERE id < ? ORDER BY id DESC LIMIT ?"
 
-    ar = (request.args.get("ar") or request.form.get("ar") or "30").strip()   # 7, 30, all
-    aa = (request.args.get("aa") or request.form.get("aa") or "").strip()     # assessor name
+def _fts_match(q: str) -> str:
+    # every term as a quoted prefix query, ANDed together
+    return " ".join('"%s"*' % term for term in q.replace('"', " ").split())
 
-    message = None
-    result = None
-    form_data = {}
+def _has_patient_fts(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+    ).fetchone() is not None
 
-    conn = get_conn()
+MAX_ROWID = 2 ** 63 - 1
 
-    if request.method == "POST":
-        action = request.form.get("action", "")
-        form_data = request.form.to_dict()
+def patient_cursor(value: str):
+    # ?before= as an id, clamped to SQLite's integer range
+    return min(int(value), MAX_ROWID) if value.isdecimal() else None
+
+def patient_page(conn, q: str = "", before: int = None, limit: int = PATIENT_PAGE_SIZE):
+    # Keyset pagination: newest first, next page continues below the last id.
+    cursor = before if before else MAX_ROWID
+    match = _fts_match(q)
+    if match and _has_patient_fts(conn):
+        rows = conn.execute(
+            """SELECT p.* FROM patients_fts f JOIN patients p ON p.id = f.rowid
+               WHERE patients_fts MATCH ? AND f.rowid < ? ORDER BY f.rowid DESC LIMIT ?""",
+            (match, cursor, limit + 1),
+        ).fetchall()
+    elif match:
+        like = "%" + q.strip() + "%"
+        rows = conn.execute(
+            """SELECT * FROM patients WHERE (name LIKE ? OR village LIKE ?) AND id < ?
+               ORDER BY id DESC LIMIT ?""",
+            (like, like, cursor, limit + 1),
+        ).fetchall()
+    else:
+        rows = conn.execute(PATIENT_PAGE_SQL, (cursor, limit + 1)).fetchall()
 
-        if action == "add_patient":
-            name = (request.form.get("p_name") or "").strip()
-            village = (request.form.get("p_village") or "").strip()
-            age_group = request.form.get("p_age_group", "1_5y")
+    patients = []
+    for r in rows[:limit]:
+        d = dict(r)
+        d["age_group_label"] = age_group_label(d["age_group"])
+        patients.append(d)
+    next_before = patients[-1]["id"] if len(rows) > limit else None
+    return patients, next_before
+
+def patient_id_value(value):
+    # A patient id from a request as an int, or None; ids beyond SQLite's
+    # integer range cannot exist.
+    value = str(value).strip()
+    if not value.isdecimal() or int(value) > MAX_ROWID:
+        return None
+    return int(value)
+
+def get_patient(conn, patient_id):
+    patient_id = patient_id_value(patient_id)
+    if patient_id is None:
+        return None
+    row = conn.execute("SELECT * FROM patients WHERE id = ?", (patient_id,)).fetchone()
+    return dict(row) if row else None
+
+def add_patient(conn, name: str, village: str, age_group: str) -> int:
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    cur = conn.execute(
+        "INSERT INTO patients (name, village, age_group, created_at) VALUES (?,?,?,?)",
+        (name, village, age_group, now),
+    )
+    conn.commit()
+    return cur.lastrowid
 
-            if not name:
-                message = "Patient name is required."
+def delete_patient(conn, patient_id: int):
+    rollup_remove_patient(conn, patient_id)
+    conn.execute("DELETE FROM screenings WHERE patient_id = ?", (patient_id,))
+    conn.execute("DELETE FROM patients WHERE id = ?", (patient_id,))
+    conn.commit()
+    invalidate_analytics_cache()
+
+def save_screening(conn, answers: dict, lang: str, selected_patient=None) -> dict:
+    result = compute_result(answers, lang=lang, selected_patient=selected_patient)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    pid = selected_patient["id"] if selected_patient else None
+    cur = conn.execute(SCREENING_INSERT_SQL, screening_row(pid, now, result))
+    enqueue_job(conn, "fold_rollup", coalesce=True)
+    conn.commit()
+    invalidate_analytics_cache()
+    notify_jobs(conn)
+    result["id"] = cur.lastrowid
+    return result
+
+def patient_history(conn, patient_id: int, lang: str) -> list:
+    history = [dict(x) for x in conn.execute(HISTORY_SQL, (patient_id,)).fetchall()]
+    for h in history:
+        if h["condition_code"]:
+            h["top_condition"] = condition_code_label(lang, h["condition_code"])
+    return history
+
+def assessor_names(conn) -> list:
+    return [r["assessor"] for r in conn.execute(ASSESSOR_NAMES_SQL).fetchall()]
+
+# -------------------- Export --------------------
+
+EXPORT_COLUMNS = (
+    ["id", "created_at", "assessor", "patient_id", "patient_name", "patient_village", "patient_age_group",
+     "risk", "condition", "condition_code", "certainty"]
+    + [col for col, _ in ANSWER_COLUMNS]
+    + list(PROB_COLUMNS.values())
+)
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson; charset=utf-8"}
+EXPORT_BATCH = 500
+
+def _parse_export_date(value, name: str):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD.")
+
+def export_query(date_from=None, date_to=None, assessor=None):
+    # Dates are inclusive calendar days. Rows come out in (created_at, id)
+    # order, which both screenings indexes already provide, so the scan
+    # never needs a temporary sort.
+    where, params = [], []
+    date_from = _parse_export_date(date_from, "from")
+    date_to = _parse_export_date(date_to, "to")
+    if assessor:
+        where.append("s.assessor = ?")
+        params.append(assessor)
+    if date_from:
+        where.append("s.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("s.created_at < date(?, '+1 day')")
+        params.append(date_to)
+
+    cols = ", ".join(f"s.{col}" for col in [c for c, _ in ANSWER_COLUMNS] + list(PROB_COLUMNS.values()))
+    sql = f"""SELECT s.id, s.created_at, s.assessor, s.patient_id, p.name, p.village, p.age_group,
+                     s.risk, s.top_condition, s.condition_code, s.certainty, {cols}
+              FROM screenings s LEFT JOIN patients p ON p.id = s.patient_id"""
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY s.created_at, s.id"
+    return sql, params
+
+def iter_export(conn, fmt: str = "csv", date_from=None, date_to=None, assessor=None):
+    # Yields the export as text chunks of EXPORT_BATCH rows, fetched from
+    # a single cursor so memory use does not grow with the row count.
+    sql, params = export_query(date_from, date_to, assessor)
+    cur = conn.execute(sql, params)
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+    while True:
+        rows = cur.fetchmany(EXPORT_BATCH)
+        if not rows:
+            break
+        for row in rows:
+            if writer:
+                writer.writerow(row)
             else:
-                now = datetime.now().strftime("%Y-%m-%d %H:%M")
-                conn.execute(
-                    "INSERT INTO patients (name, village, age_group, created_at) VALUES (?,?,?,?)",
-                    (name, village, age_group, now),
-                )
-                conn.commit()
-                new_id = conn.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
+                buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                buf.write("\n")
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if writer and buf.tell():
+        yield buf.getvalue()
+
+# -------------------- Parquet --------------------
+
+# Columnar snapshot of screenings for cross-facility reviews: one file per
+# source database per month, laid out as <dir>/month=YYYY-MM/<source>.parquet.
+# Assessor and condition code are normalized the way the rollup stores them.
+PARQUET_BATCH = 50000
+
+def parquet_schema():
+    pa = arrow_modules()[0]
+    fields = [
+        ("id", pa.int64()),
+        ("patient_id", pa.int64()),
+        ("created_at", pa.timestamp("s")),
+        ("assessor", pa.string()),
+        ("risk", pa.string()),
+        ("condition", pa.string()),
+        ("condition_code", pa.int8()),
+        ("certainty", pa.int16()),
+    ]
+    for col, sql_type in ANSWER_COLUMNS:
+        if sql_type == "TEXT":
+            fields.append((col, pa.string()))
+        elif col == "rr":
+            fields.append((col, pa.int16()))
+        else:
+            fields.append((col, pa.bool_()))
+    fields += [(col, pa.float64()) for col in PROB_COLUMNS.values()]
+    return pa.schema(fields)
+
+PARQUET_SQL = (
+    "SELECT id, patient_id, created_at, COALESCE(TRIM(assessor), ''), risk, top_condition, "
+    "COALESCE(condition_code, 0), certainty, "
+    + ", ".join([col for col, _ in ANSWER_COLUMNS] + list(PROB_COLUMNS.values()))
+    + " FROM screenings ORDER BY created_at, id"
+)
+
+def _parquet_batch(schema, rows):
+    pa, pc, _, _ = arrow_modules()
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if field.name == "created_at":
+            arrays.append(pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M", unit="s", error_is_null=True))
+        elif pa.types.is_boolean(field.type):
+            arrays.append(pa.array([None if v is None else bool(v) for v in values], field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def export_parquet(conn, out_dir: str, source: str) -> dict:
+    # Rows are read in created_at order, so each month's file is written
+    # start to finish by one ParquetWriter. Returns {month: row count}.
+    if arrow_modules() is None:
+        raise RuntimeError("pyarrow is not installed.")
+    pq = arrow_modules()[3]
+    schema = parquet_schema()
+    cur = conn.execute(PARQUET_SQL)
+    counts = {}
+    month, writer = None, None
+    try:
+        while True:
+            rows = cur.fetchmany(PARQUET_BATCH)
+            if not rows:
+                break
+            start = 0
+            for i in range(len(rows) + 1):
+                row_month = rows[i][2][:7] if i < len(rows) else None
+                if i < len(rows) and row_month == month:
+                    continue
+                if i > start:
+                    writer.write_batch(_parquet_batch(schema, rows[start:i]))
+                    counts[month] += i - start
+                if i == len(rows):
+                    break
+                if writer:
+                    writer.close()
+                month, start = row_month, i
+                part_dir = os.path.join(out_dir, f"month={month}")
+                os.makedirs(part_dir, exist_ok=True)
+                writer = pq.ParquetWriter(os.path.join(part_dir, f"{source}.parquet"), schema, compression="zstd")
+                counts[month] = 0
+    finally:
+        if writer:
+            writer.close()
+    return counts
+
+def parquet_analytics(path: str, ar: str, aa: str, lang: str = "en"):
+    # compute_analytics over an export directory: month partitions outside
+    # a 7/30-day window are skipped, and each scanned batch is grouped on
+    # its own so memory does not grow with the data.
+    if arrow_modules() is None:
+        raise RuntimeError("pyarrow is not installed.")
+    pa, _, pads, _ = arrow_modules()
+    dataset = pads.dataset(
+        path, format="parquet",
+        partitioning=pads.partitioning(pa.schema([("month", pa.string())]), flavor="hive"),
+    )
+    conds = []
+    if ar in ("7", "30"):
+        start_dt = (datetime.now() - timedelta(days=int(ar))).replace(second=0, microsecond=0)
+        conds.append(pads.field("month") >= start_dt.strftime("%Y-%m"))
+        conds.append(pads.field("created_at") >= pa.scalar(start_dt, pa.timestamp("s")))
+    if aa:
+        conds.append(pads.field("assessor") == aa)
+    filt = functools.reduce(lambda x, y: x & y, conds) if conds else None
+
+    keys = ["assessor", "risk", "condition_code"]
+    signs = [key for key, _ in DANGER_SIGN_KEYS]
+    aggs = [("id", "count")] + [(key, "sum") for key in signs]
+    groups = []
+    for batch in dataset.to_batches(columns=keys + ["id"] + signs, filter=filt):
+        if not batch.num_rows:
+            continue
+        grouped = pa.Table.from_batches([batch]).group_by(keys).aggregate(aggs)
+        cols = [grouped.column(name).to_pylist() for name in keys + ["id_count"] + [f"{key}_sum" for key in signs]]
+        groups += [row[:4] + tuple(v or 0 for v in row[4:]) for row in zip(*cols)]
+    return analytics_from_groups(groups, lang)
+
+# -------------------- Merge --------------------
+
+# Device databases are pulled into a central store incrementally: rows
+# above the device's high-water marks are copied with set-based INSERTs
+# over an ATTACHed file, keyed by (source_device, source_id) so a re-run
+# never duplicates. Rows that already came from another store keep their
+# original origin, so stores can themselves be merged upward.
+MERGE_SKIP_COLUMNS = {"id", "patient_id", "source_device", "source_id"}
+
+# Screening columns copied between devices, shared by merge and sync.
+def _sync_columns(conn) -> list:
+    return [r["name"] for r in conn.execute("PRAGMA table_info(screenings)") if r["name"] not in MERGE_SKIP_COLUMNS]
+
+def device_id(conn, schema: str = "main") -> str:
+    return conn.execute(f"SELECT device_id FROM {schema}.db_state WHERE id = 1").fetchone()[0]
+
+def merge_device_db(conn, path: str) -> dict:
+    if not os.path.isfile(path):
+        raise ValueError(f"{path} does not exist.")
+    conn.execute("ATTACH DATABASE ? AS src", (path,))
+    try:
+        version = conn.execute("PRAGMA src.user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"{path} is at schema version {version}, expected {SCHEMA_VERSION}; run migrate-db on it first.")
+        device = device_id(conn, "src")
+        if device == device_id(conn):
+            raise ValueError(f"{path} is this database.")
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT patients_hwm, screenings_hwm FROM merge_sources WHERE device_id = ?", (device,)
+            ).fetchone()
+            p_hwm, s_hwm = (row["patients_hwm"], row["screenings_hwm"]) if row else (0, 0)
+            p_top = conn.execute("SELECT COALESCE(MAX(id), ?) FROM src.patients", (p_hwm,)).fetchone()[0]
+            s_top = conn.execute("SELECT COALESCE(MAX(id), ?) FROM src.screenings", (s_hwm,)).fetchone()[0]
+
+            cur = conn.execute(
+                """INSERT OR IGNORE INTO patients (name, village, age_group, created_at, source_device, source_id)
+                   SELECT name, village, age_group, created_at, COALESCE(source_device, ?), COALESCE(source_id, id)
+                   FROM src.patients WHERE id > ? AND id <= ? ORDER BY id""",
+                (device, p_hwm, p_top),
+            )
+            patients_added = cur.rowcount
+
+            cols = _sync_columns(conn)
+            cur = conn.execute(
+                f"""INSERT OR IGNORE INTO screenings (patient_id, {", ".join(cols)}, source_device, source_id)
+                    SELECT cp.id, {", ".join("s." + c for c in cols)},
+                           COALESCE(s.source_device, :device), COALESCE(s.source_id, s.id)
+                    FROM src.screenings s
+                    LEFT JOIN src.patients sp ON sp.id = s.patient_id
+                    LEFT JOIN patients cp ON cp.source_device = COALESCE(sp.source_device, :device)
+                                         AND cp.source_id = COALESCE(sp.source_id, sp.id)
+                    WHERE s.id > :lo AND s.id <= :hi ORDER BY s.id""",
+                {"device": device, "lo": s_hwm, "hi": s_top},
+            )
+            screenings_added = cur.rowcount
+            fold_rollup(conn)
+
+            conn.execute(
+                """INSERT INTO merge_sources (device_id, path, patients_hwm, screenings_hwm, merged_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(device_id) DO UPDATE SET path = excluded.path, patients_hwm = excluded.patients_hwm,
+                     screenings_hwm = excluded.screenings_hwm, merged_at = excluded.merged_at""",
+                (device, path, p_top, s_top, datetime.now().strftime("%Y-%m-%d %H:%M")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+    invalidate_analytics_cache()
+    return {"device_id": device, "patients": patients_added, "screenings": screenings_added}
+
+# -------------------- Sync --------------------
+
+# Offline devices push their sync_log since the last acknowledged
+# checkpoint as zlib-compressed JSON batches. Each row id appears once per
+# batch with its current state (or as a tombstone), keyed by its origin
+# (source_device, source_id) like merged rows. The hub applies a batch in
+# one transaction and records the highest seq applied per device, so a
+# resent batch is a no-op and a batch that starts past it (one was skipped)
+# is rejected. Rows received from other devices are not logged again, so
+# they are not forwarded on a later push, and a batch may only carry rows
+# that originated on the device that sent it.
+SYNC_BATCH_ROWS = 2000
+SYNC_MAX_BYTES = 64 * 1024 * 1024
+SYNC_PATIENT_COLUMNS = ["name", "village", "age_group", "created_at"]
+
+def build_sync_batch(conn, limit: int = SYNC_BATCH_ROWS):
+    # Returns (payload, to_seq), or None when everything is synced.
+    device = device_id(conn)
+    checkpoint = conn.execute("SELECT sync_checkpoint FROM db_state WHERE id = 1").fetchone()[0]
+    to_seq = conn.execute(
+        "SELECT MAX(seq) FROM (SELECT seq FROM sync_log WHERE seq > ? ORDER BY seq LIMIT ?)", (checkpoint, limit)
+    ).fetchone()[0]
+    if to_seq is None:
+        return None
+
+    latest = conn.execute(
+        """SELECT l.tbl, l.row_id, l.op
+           FROM sync_log l JOIN (SELECT MAX(seq) AS seq FROM sync_log WHERE seq > ? AND seq <= ?
+                                 GROUP BY tbl, row_id) m ON m.seq = l.seq""",
+        (checkpoint, to_seq),
+    ).fetchall()
+    upserts = {"patients": [], "screenings": []}
+    deleted = {"patients": [], "screenings": []}
+    for tbl, row_id, op in latest:
+        if op == "upsert":
+            upserts[tbl].append(row_id)
+        else:
+            deleted[tbl].append([device, row_id])
+
+    patient_cols = SYNC_PATIENT_COLUMNS
+    patients = conn.execute(
+        f"""SELECT COALESCE(source_device, ?), COALESCE(source_id, id), {", ".join(patient_cols)}
+            FROM patients WHERE id IN (SELECT value FROM json_each(?))""",
+        (device, json.dumps(upserts["patients"])),
+    ).fetchall()
+    screening_cols = _sync_columns(conn)
+    screenings = conn.execute(
+        f"""SELECT COALESCE(s.source_device, :device), COALESCE(s.source_id, s.id),
+                   COALESCE(p.source_device, :device), COALESCE(p.source_id, p.id),
+                   {", ".join("s." + c for c in screening_cols)}
+            FROM screenings s LEFT JOIN patients p ON p.id = s.patient_id
+            WHERE s.id IN (SELECT value FROM json_each(:ids))""",
+        {"device": device, "ids": json.dumps(upserts["screenings"])},
+    ).fetchall()
+
+    batch = {
+        "device_id": device,
+        "schema_version": SCHEMA_VERSION,
+        "from_seq": checkpoint,
+        "to_seq": to_seq,
+        "patients": {"columns": patient_cols, "rows": [list(r) for r in patients]},
+        "screenings": {"columns": screening_cols, "rows": [list(r) for r in screenings]},
+        "deleted": deleted,
+    }
+    return zlib.compress(json.dumps(batch, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9), to_seq
+
+def mark_synced(conn, to_seq: int):
+    # The hub acknowledged everything up to to_seq.
+    conn.execute("UPDATE db_state SET sync_checkpoint = MAX(sync_checkpoint, ?) WHERE id = 1", (to_seq,))
+    conn.execute("DELETE FROM sync_log WHERE seq <= ?", (to_seq,))
+    conn.commit()
+
+class SyncGapError(ValueError):
+    pass
+
+def _by_device(keys) -> dict:
+    grouped = {}
+    for src_device, src_id in keys:
+        grouped.setdefault(src_device, []).append(src_id)
+    return grouped
+
+def _load_sync_batch(payload: bytes) -> dict:
+    inflate = zlib.decompressobj()
+    data = inflate.decompress(payload, SYNC_MAX_BYTES)
+    if inflate.unconsumed_tail:
+        raise ValueError(f"Batch is larger than {SYNC_MAX_BYTES} bytes uncompressed.")
+    if not inflate.eof:
+        raise ValueError("Batch is truncated.")
+    batch = json.loads(data.decode("utf-8"))
+    if not isinstance(batch, dict) or not all(isinstance(batch.get(k), dict) for k in ("patients", "screenings", "deleted")):
+        raise ValueError("Batch is not a sync batch object.")
+    return batch
+
+def apply_sync_batch(conn, payload: bytes) -> dict:
+    batch = _load_sync_batch(payload)
+    if batch.get("schema_version") != SCHEMA_VERSION:
+        raise ValueError(f"Batch is for schema version {batch.get('schema_version')}, expected {SCHEMA_VERSION}.")
+    device = batch["device_id"]
+    if not isinstance(device, str) or not device:
+        raise ValueError("Batch has no device_id.")
+    if device == device_id(conn):
+        raise ValueError("Batch was built from this database.")
+    own_keys = [r[:2] for tbl in ("patients", "screenings") for r in batch[tbl]["rows"]]
+    own_keys += batch["deleted"]["patients"] + batch["deleted"]["screenings"]
+    if any(key[0] != device for key in own_keys):
+        raise ValueError(f"Batch from {device} carries rows that originated on another device.")
+    patient_cols = batch["patients"]["columns"]
+    screening_cols = batch["screenings"]["columns"]
+    if set(screening_cols) != set(_sync_columns(conn)) or patient_cols != SYNC_PATIENT_COLUMNS:
+        raise ValueError("Batch columns do not match this database.")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT applied_seq FROM sync_peers WHERE device_id = ?", (device,)).fetchone()
+        applied_seq = row["applied_seq"] if row else 0
+        if applied_seq >= batch["to_seq"]:
+            conn.rollback()
+            return {"device_id": device, "to_seq": batch["to_seq"], "applied": False}
+        if batch["from_seq"] > applied_seq:
+            raise SyncGapError(
+                f"Batch starts after seq {batch['from_seq']} but only seq {applied_seq} of {device} is applied; "
+                "apply the missing batches first."
+            )
+
+        screening_keys = [r[:2] for r in batch["screenings"]["rows"]] + batch["deleted"]["screenings"]
+        key_where = "source_device = ? AND source_id IN (SELECT value FROM json_each(?))"
+        rolled_where = f"{key_where} AND id <= {ROLLUP_HWM_SQL}"
+        # take the current versions of touched screenings out of the rollup
+        for src_device, ids in _by_device(screening_keys).items():
+            _rollup_from_screenings(conn, rolled_where, (src_device, json.dumps(ids)), sign=-1)
+        for src_device, ids in _by_device(batch["deleted"]["screenings"]).items():
+            conn.execute(f"DELETE FROM screenings WHERE {key_where}", (src_device, json.dumps(ids)))
+
+        set_sql = ", ".join(f"{c} = excluded.{c}" for c in patient_cols)
+        conn.executemany(
+            f"""INSERT INTO patients (source_device, source_id, {", ".join(patient_cols)})
+                VALUES ({", ".join("?" * (len(patient_cols) + 2))})
+                ON CONFLICT(source_device, source_id) WHERE source_device IS NOT NULL DO UPDATE SET {set_sql}""",
+            batch["patients"]["rows"],
+        )
+        set_sql = ", ".join(f"{c} = excluded.{c}" for c in ["patient_id"] + screening_cols)
+        conn.executemany(
+            f"""INSERT INTO screenings (source_device, source_id, patient_id, {", ".join(screening_cols)})
+                VALUES (?, ?, (SELECT id FROM patients WHERE source_device = ? AND source_id = ?),
+                        {", ".join("?" * len(screening_cols))})
+                ON CONFLICT(source_device, source_id) WHERE source_device IS NOT NULL DO UPDATE SET {set_sql}""",
+            batch["screenings"]["rows"],
+        )
+        for src_device, ids in _by_device(r[:2] for r in batch["screenings"]["rows"]).items():
+            _rollup_from_screenings(conn, rolled_where, (src_device, json.dumps(ids)))
+        fold_rollup(conn)
+
+        for src_device, ids in _by_device(batch["deleted"]["patients"]).items():
+            conn.execute(f"DELETE FROM patients WHERE {key_where}", (src_device, json.dumps(ids)))
+
+        conn.execute(
+            """INSERT INTO sync_peers (device_id, applied_seq, applied_at) VALUES (?, ?, ?)
+               ON CONFLICT(device_id) DO UPDATE SET applied_seq = excluded.applied_seq, applied_at = excluded.applied_at""",
+            (device, batch["to_seq"], datetime.now().strftime("%Y-%m-%d %H:%M")),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    invalidate_analytics_cache()
+    return {
+        "device_id": device,
+        "to_seq": batch["to_seq"],
+        "applied": True,
+        "patients": len(batch["patients"]["rows"]),
+        "screenings": len(batch["screenings"]["rows"]),
+        "deleted": {k: len(v) for k, v in batch["deleted"].items()},
+    }
+
+# -------------------- Jobs --------------------
+
+# Derived work (rollup folding, export files) runs on a background thread
+# from the persistent jobs table, so request handlers return as soon as
+# their own rows are committed. While a job runs, its worker refreshes
+# heartbeat_at every JOB_HEARTBEAT_SECONDS; a job whose heartbeat stops
+# for JOB_STALE_MINUTES (dead or suspended process) is retried. Each claim
+# gets an owner token, so a worker that resumes after its job was requeued
+# cannot overwrite the new run's status or export file.
+JOB_POLL_SECONDS = 5.0
+JOB_MAX_ATTEMPTS = 3
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_MINUTES = 2
+EXPORT_DIR = os.environ.get("TOTO_EXPORT_DIR", "exports")
+
+_job_worker_lock = threading.Lock()
+_job_workers = {}   # database file -> (thread, wakeup event)
+
+def enqueue_job(conn, kind: str, payload: dict = None, coalesce: bool = False) -> int:
+    # Joins the caller's transaction; coalesce reuses an identical queued job.
+    payload = json.dumps(payload or {}, sort_keys=True)
+    if coalesce:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' AND kind = ? AND payload = ?", (kind, payload)
+        ).fetchone()
+        if row:
+            return row[0]
+    cur = conn.execute(
+        "INSERT INTO jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+        (kind, payload, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    )
+    return cur.lastrowid
+
+def _job_fold_rollup(conn, job):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        folded = fold_rollup(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"folded": folded}
+
+def _job_export(conn, job):
+    payload = json.loads(job["payload"])
+    fmt = payload.get("format", "csv")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"screenings-{job['id']}.{fmt}")
+    part = f"{path}.{job['owner']}.part"
+    size = 0
+    with open(part, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_export(conn, fmt, payload.get("from"), payload.get("to"), payload.get("assessor")):
+            size += f.write(chunk)
+    os.replace(part, path)
+    return {"path": path, "format": fmt, "size": size}
+
+JOB_HANDLERS = {
+    "fold_rollup": _job_fold_rollup,
+    "export": _job_export,
+}
+
+def database_file(conn) -> str:
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+@contextlib.contextmanager
+def _job_heartbeat(path: str, job_id: int, owner: str):
+    # refreshes heartbeat_at from a side thread while the job runs
+    stop = threading.Event()
+
+    def beat():
+        conn = connect(path)
+        try:
+            while not stop.wait(JOB_HEARTBEAT_SECONDS):
+                try:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ?",
+                        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id, owner),
+                    )
+                    conn.commit()
+                except sqlite3.Error:
+                    app.logger.exception("Job %s heartbeat failed", job_id)
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target=beat, name="toto-job-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_next_job(conn) -> bool:
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+        ((datetime.now() - timedelta(minutes=JOB_STALE_MINUTES)).strftime("%Y-%m-%d %H:%M:%S"),),
+    )
+    owner = os.urandom(8).hex()
+    job = conn.execute(
+        """UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, heartbeat_at = ?, owner = ?
+           WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+           RETURNING id, kind, payload, attempts, owner""",
+        (now, now, owner),
+    ).fetchone()
+    conn.commit()
+    if job is None:
+        return False
+
+    with _job_heartbeat(database_file(conn), job["id"], owner):
+        try:
+            result, error = JOB_HANDLERS[job["kind"]](conn, job), None
+            status = "done"
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            app.logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+            result, error = None, f"{type(e).__name__}: {e}"
+            status = "failed" if job["attempts"] >= JOB_MAX_ATTEMPTS else "queued"
+    # a no-op if the job was requeued and claimed by another worker meanwhile
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+        (status, json.dumps(result) if result is not None else None, error,
+         datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job["id"], owner),
+    )
+    conn.commit()
+    return True
+
+def run_jobs(conn) -> int:
+    done = 0
+    while run_next_job(conn):
+        done += 1
+    return done
+
+def _job_loop(path: str, wakeup: threading.Event):
+    while True:
+        wakeup.wait(JOB_POLL_SECONDS)
+        wakeup.clear()
+        try:
+            conn = connect(path)
+            try:
+                run_jobs(conn)
+            finally:
                 conn.close()
-                return redirect(url_for("index", patient_id=new_id, ar=ar, aa=aa, lang=lang))
+        except sqlite3.Error:
+            app.logger.exception("Job worker error")
+
+def notify_jobs(conn=None):
+    # Wakes (starting if needed) the worker for conn's database file.
+    path = database_file(conn) if conn is not None else os.path.abspath(DB_PATH)
+    with _job_worker_lock:
+        worker = _job_workers.get(path)
+        if worker is None or not worker[0].is_alive():
+            wakeup = threading.Event()
+            thread = threading.Thread(target=_job_loop, args=(path, wakeup), name="toto-jobs", daemon=True)
+            thread.start()
+            _job_workers[path] = worker = (thread, wakeup)
+    worker[1].set()
+
+# -------------------- Query plans --------------------
+
+HISTORY_SQL = (
+    "SELECT created_at, risk, top_condition, condition_code, certainty FROM screenings "
+    "WHERE patient_id = ? ORDER BY id DESC LIMIT 5"
+)
+ASSESSOR_NAMES_SQL = f"""
+    SELECT assessor FROM analytics_rollup WHERE assessor != ''
+    UNION
+    SELECT TRIM(assessor) FROM screenings WHERE id > {ROLLUP_HWM_SQL} AND TRIM(assessor) != ''
+    ORDER BY 1
+"""
 
-        elif action == "delete_patient":
-            del_id = (request.form.get("patient_id") or "").strip()
-            if del_id.isdigit():
-                conn.execute("DELETE FROM screenings WHERE patient_id = ?", (int(del_id),))
-                conn.execute("DELETE FROM patients WHERE id = ?", (int(del_id),))
-                conn.commit()
-                if patient_id == del_id:
-                    conn.close()
-                    return redirect(url_for("index", ar=ar, aa=aa, lang=lang))
+def hot_query_plans() -> list:
+    # (label, sql, params, index the plan must use)
+    rollup_7, partial_7, tail_7 = _analytics_queries("7", "")
+    rollup_7_aa, partial_7_aa, _ = _analytics_queries("7", "x")
+    rollup_all_aa, _ = _analytics_queries("all", "x")
+    return [
+        ("analytics window (rollup)", *rollup_7, "PRIMARY KEY"),
+        ("analytics window (partial day)", *partial_7, "idx_screenings_created_at"),
+        ("analytics assessor (rollup)", *rollup_7_aa, "idx_rollup_assessor"),
+        ("analytics assessor (partial day)", *partial_7_aa, "idx_screenings_assessor"),
+        ("analytics assessor all-time", *rollup_all_aa, "idx_rollup_assessor"),
+        ("analytics unfolded tail", *tail_7, "INTEGER PRIMARY KEY"),
+        ("assessor dropdown", ASSESSOR_NAMES_SQL, [], "idx_rollup_assessor"),
+        ("patient history", HISTORY_SQL, [1], "idx_screenings_patient"),
+        ("patient page", PATIENT_PAGE_SQL, [100, PATIENT_PAGE_SIZE + 1], "INTEGER PRIMARY KEY"),
+        ("delete patient screenings", "DELETE FROM screenings WHERE patient_id = ?", [1], "idx_screenings_patient"),
+        ("export date range", *export_query("2024-01-01", "2024-01-31"), "idx_screenings_created_at"),
+        ("export assessor", *export_query("2024-01-01", None, "x"), "idx_screenings_assessor"),
+    ]
+
+def check_query_plans(conn) -> list:
+    failures = []
+    for label, sql, params, index_name in hot_query_plans():
+        plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        if not any(index_name in step for step in plan):
+            failures.append((label, index_name, plan))
+    return failures
+
+# -------------------- HTTP caching --------------------
+
+# Changes whenever the code, templates, translations or scoring rules
+# change, so cached pages are not reused across deployments.
+def _deployed_files() -> list:
+    files = [os.path.abspath(__file__), SCORING_RULES_PATH]
+    for folder in (os.path.join(app.root_path, app.template_folder), I18N_DIR):
+        files += [os.path.join(folder, n) for n in sorted(os.listdir(folder))]
+    return files
+
+ETAG_SALT = "%s:%s" % (SCHEMA_VERSION, ":".join(str(os.path.getmtime(p)) for p in _deployed_files()))
+
+def conditional_get(time_window: bool = False):
+    # GETs are validated by the data change counter plus the full request
+    # path; views with a 7/30-day window also vary by the current minute.
+    # A matching If-None-Match (or If-Modified-Since) returns 304 before
+    # the view runs any query.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            seq, last_modified = data_state(get_conn())
+            parts = [ETAG_SALT, seq, request.full_path]
+            if time_window and (request.args.get("ar") or "30") != "all":
+                now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+                parts.append(now.isoformat())
+                last_modified = max(last_modified, now)
+            etag = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:24]
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and last_modified <= since
+
+            if not_modified:
+                resp = app.response_class(status=304)
             else:
-                message = "Invalid patient id."
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return decorator
 
-        elif action == "run_screening":
-            selected_patient = None
-            if patient_id.isdigit():
-                row = conn.execute("SELECT * FROM patients WHERE id = ?", (int(patient_id),)).fetchone()
-                if row:
-                    selected_patient = dict(row)
+# -------------------- Routes --------------------
 
-            result = compute_result(form_data, lang=lang, selected_patient=selected_patient)
+def resolve_lang(value) -> str:
+    lang = str(value or "en").strip().lower()
+    return lang if lang in LANGUAGES else "en"
 
-            now = datetime.now().strftime("%Y-%m-%d %H:%M")
-            pid_to_save = int(patient_id) if patient_id.isdigit() else None
+# Each page action has its own route and loads only what it shows. After a
+# form post the history and analytics panels are rendered as placeholders
+# that the page fetches from /fragments/* once the result is on screen.
 
-            conn.execute(
-                """INSERT INTO screenings
-                   (patient_id, created_at, risk, top_condition, certainty, share_message, raw_answers, assessor)
-                   VALUES (?,?,?,?,?,?,?,?)""",
-                (
-                    pid_to_save,
-                    now,
-                    result["risk"],
-                    result["top_condition"],
-                    int(result["certainty"]),
-                    result["share_message"],
-                    json.dumps(result["raw_answers"], ensure_ascii=False),
-                    result["assessor"],
-                ),
+def page_args() -> dict:
+    return {
+        "lang": resolve_lang(request.args.get("lang") or request.form.get("lang")),
+        "patient_id": (request.args.get("patient_id") or "").strip(),
+        "pq": (request.args.get("pq") or "").strip(),            # patient search
+        "before": (request.args.get("before") or "").strip(),    # patient page cursor
+        "ar": (request.args.get("ar") or request.form.get("ar") or "30").strip(),   # 7, 30, all
+        "aa": (request.args.get("aa") or request.form.get("aa") or "").strip(),     # assessor name
+    }
+
+def render_page(conn, args: dict, selected_patient, result=None, form=None, message=None, lazy_panels=False):
+    lang = args["lang"]
+
+    # patients (one keyset page)
+    with phase("patients"):
+        patients, next_before = patient_page(conn, q=args["pq"], before=patient_cursor(args["before"]))
+
+    history = analytics = None
+    assessors = []
+    if not lazy_panels:
+        with phase("history"):
+            history = patient_history(conn, selected_patient["id"], lang) if selected_patient else []
+        with phase("analytics"):
+            analytics = cached_analytics(conn, ar=args["ar"], aa=args["aa"], lang=lang)
+            assessors = assessor_names(conn)
+
+    with phase("render"):
+        return render_template(
+            PAGE_TEMPLATE,
+            t=make_t(lang),
+            lang=lang,
+            lang_choices=LANG_CHOICES,
+            result=result,
+            form=form or {},
+            message=message,
+            patients=patients,
+            pq=args["pq"],
+            before=args["before"],
+            next_before=next_before,
+            selected_patient=selected_patient,
+            history=history,
+            default_age_group=selected_patient["age_group"] if selected_patient else "1_5y",
+            analytics=analytics,
+            assessor_names=assessors,
+            ar=args["ar"],
+            aa=args["aa"],
+        )
+
+def _index_url(args: dict, **overrides) -> str:
+    params = {k: args[k] or None for k in ("patient_id", "pq", "before", "ar", "aa", "lang")}
+    params.update(overrides)
+    return url_for("index", **params)
+
+@app.route("/", methods=["GET", "POST"])
+@conditional_get(time_window=True)
+def index():
+    if request.method == "POST":
+        # forms posted here before the per-action routes existed
+        handler = PAGE_ACTIONS.get(request.form.get("action", ""))
+        if handler is not None:
+            return handler()
+
+    conn = get_conn()
+    args = page_args()
+    return render_page(
+        conn, args, get_patient(conn, args["patient_id"]),
+        form=request.form.to_dict() if request.method == "POST" else None,
+    )
+
+@app.route("/patients", methods=["POST"])
+def add_patient_view():
+    conn = get_conn()
+    args = page_args()
+    name = (request.form.get("p_name") or "").strip()
+    village = (request.form.get("p_village") or "").strip()
+    age_group = request.form.get("p_age_group", "1_5y")
+
+    if not name:
+        return render_page(
+            conn, args, get_patient(conn, args["patient_id"]),
+            form=request.form.to_dict(), message="Patient name is required.", lazy_panels=True,
+        )
+    new_id = add_patient(conn, name, village, age_group)
+    return redirect(_index_url(args, patient_id=new_id, pq=None, before=None))
+
+@app.route("/patients/<int:patient_id>/delete", methods=["POST"])
+def delete_patient_view(patient_id=None):
+    conn = get_conn()
+    args = page_args()
+    if patient_id is None:
+        # legacy form: the id comes in the body, the selected patient in the query
+        patient_id = patient_id_value(request.form.get("patient_id") or "")
+        if patient_id is None:
+            return render_page(
+                conn, args, get_patient(conn, args["patient_id"]),
+                form=request.form.to_dict(), message="Invalid patient id.", lazy_panels=True,
             )
-            conn.commit()
+    else:
+        args["patient_id"] = (request.args.get("selected") or "").strip()
 
-    # patients
-    patients_rows = conn.execute("SELECT * FROM patients ORDER BY id DESC").fetchall()
-    patients = []
-    for r in patients_rows:
-        d = dict(r)
-        d["age_group_label"] = age_group_label(d["age_group"])
-        patients.append(d)
+    if patient_id <= MAX_ROWID:
+        delete_patient(conn, patient_id)
+    if args["patient_id"] == str(patient_id):
+        args["patient_id"] = ""
+    return redirect(_index_url(args))
 
-    # selected patient + default age group
-    selected_patient = None
-    default_age_group = "1_5y"
-    if patient_id.isdigit():
-        row = conn.execute("SELECT * FROM patients WHERE id = ?", (int(patient_id),)).fetchone()
-        if row:
-            selected_patient = dict(row)
-            default_age_group = selected_patient["age_group"]
+@app.route("/screenings", methods=["POST"])
+def run_screening_view():
+    conn = get_conn()
+    args = page_args()
+    form = request.form.to_dict()
+    selected_patient = get_patient(conn, args["patient_id"])
+    with phase("screening"):
+        result = save_screening(conn, form, args["lang"], selected_patient)
+    return render_page(conn, args, selected_patient, result=result, form=form, lazy_panels=True)
+
+PAGE_ACTIONS = {
+    "add_patient": add_patient_view,
+    "delete_patient": delete_patient_view,
+    "run_screening": run_screening_view,
+}
 
-    # history
-    history = []
-    if selected_patient:
-        rows = conn.execute(
-            "SELECT created_at, risk, top_condition, certainty FROM screenings WHERE patient_id = ? ORDER BY id DESC LIMIT 5",
-            (int(patient_id),),
-        ).fetchall()
-        history = [dict(x) for x in rows]
+@app.route("/fragments/history")
+@conditional_get()
+def history_fragment():
+    conn = get_conn()
+    lang = resolve_lang(request.args.get("lang"))
+    pid = patient_id_value(request.args.get("patient_id") or "")
+    history = patient_history(conn, pid, lang) if pid is not None else []
+    return render_template("_history.html", t=make_t(lang), lang=lang, history=history)
+
+@app.route("/fragments/analytics")
+@conditional_get(time_window=True)
+def analytics_fragment():
+    conn = get_conn()
+    args = page_args()
+    with phase("analytics"):
+        analytics = cached_analytics(conn, ar=args["ar"], aa=args["aa"], lang=args["lang"])
+        assessors = assessor_names(conn)
+    pid = patient_id_value(args["patient_id"])
+    return render_template(
+        "_analytics.html",
+        t=make_t(args["lang"]),
+        lang=args["lang"],
+        selected_patient={"id": pid} if pid is not None else None,
+        analytics=analytics,
+        assessor_names=assessors,
+        ar=args["ar"],
+        aa=args["aa"],
+    )
+
+# -------------------- JSON API --------------------
+# Each endpoint returns only the data its action needs, so clients on slow
+# links can update one panel without re-rendering the whole page.
+
+def _screening_json(result: dict) -> dict:
+    return {
+        "id": result.get("id"),
+        "risk": result["risk"],
+        "condition": result["condition"],
+        "condition_code": result["condition_code"],
+        "condition_label": result["top_condition_label"],
+        "certainty": result["certainty"],
+        "probabilities": result["probabilities"],
+        "alternatives": result["alternatives"],
+        "actions": result["actions"],
+        "tips": result["tips"],
+        "share_message": result["share_message"],
+        "wa_caregiver_url": result["wa_caregiver_url"],
+        "wa_supervisor_url": result["wa_supervisor_url"],
+    }
+
+def analytics_json(analytics: dict) -> dict:
+    return {
+        "total": analytics["total"],
+        "risk_counts": analytics["risk_counts"],
+        "top_conditions": [{"label": n, "count": c, "pct": p} for n, c, p in analytics["top_conditions"]],
+        "danger_signs": [{"label": n, "count": c} for n, c in analytics["danger_signs"]],
+        "assessor_stats": [
+            {"name": r.name, "total": r.total, "high": r.high, "high_rate": r.high_rate}
+            for r in analytics["assessor_stats"]
+        ],
+    }
+
+@app.route("/api/screenings", methods=["POST"])
+def api_run_screening():
+    answers = request.get_json(silent=True)
+    if not isinstance(answers, dict):
+        return jsonify({"error": "Expected a JSON object of screening answers."}), 400
+    answers = dict(answers)
+    lang = resolve_lang(answers.pop("lang", None))
+    patient_id = answers.pop("patient_id", None)
 
-    # assessor dropdown
+    conn = get_conn()
+    patient = None
+    if patient_id not in (None, ""):
+        patient = get_patient(conn, patient_id)
+        if patient is None:
+            return jsonify({"error": "Unknown patient id."}), 404
+
+    return jsonify(_screening_json(save_screening(conn, answers, lang, patient))), 201
+
+@app.route("/api/screenings/bulk", methods=["POST"])
+def bulk_screenings():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("screenings"), list):
+        return jsonify({"error": "Expected a JSON object with a 'screenings' list."}), 400
+
+    items = payload["screenings"]
+    if len(items) > MAX_BULK_SCREENINGS:
+        return jsonify({"error": f"At most {MAX_BULK_SCREENINGS} screenings per request."}), 413
+
+    lang = resolve_lang(payload.get("lang"))
+    results = insert_screenings_bulk(get_conn(), items, lang)
+    return jsonify({
+        "inserted": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    })
+
+@app.route("/api/patients", methods=["GET"])
+@conditional_get()
+def api_patients():
+    before = (request.args.get("before") or "").strip()
+    limit = request.args.get("limit", type=int) or PATIENT_PAGE_SIZE
+    patients, next_before = patient_page(
+        get_conn(),
+        q=(request.args.get("pq") or "").strip(),
+        before=patient_cursor(before),
+        limit=max(1, min(limit, 200)),
+    )
+    return jsonify({"patients": patients, "next_before": next_before})
+
+@app.route("/api/patients", methods=["POST"])
+def api_add_patient():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object with the patient's name."}), 400
+    name, village = data.get("name") or "", data.get("village") or ""
+    if not isinstance(name, str) or not isinstance(village, str):
+        return jsonify({"error": "Patient name and village must be strings."}), 400
+    name, village = name.strip(), village.strip()
+    if not name:
+        return jsonify({"error": "Patient name is required."}), 400
+    age_group = _answer_choice(data, "age_group", "1_5y") or "1_5y"
+    new_id = add_patient(get_conn(), name, village, age_group)
+    return jsonify({"id": new_id}), 201
+
+@app.route("/api/patients/<int:patient_id>", methods=["DELETE"])
+def api_delete_patient(patient_id):
+    conn = get_conn()
+    if get_patient(conn, patient_id) is None:
+        return jsonify({"error": "Unknown patient id."}), 404
+    delete_patient(conn, patient_id)
+    return jsonify({"deleted": patient_id})
+
+@app.route("/api/patients/<int:patient_id>/history")
+@conditional_get()
+def api_patient_history(patient_id):
+    conn = get_conn()
+    patient = get_patient(conn, patient_id)
+    if patient is None:
+        return jsonify({"error": "Unknown patient id."}), 404
+    lang = resolve_lang(request.args.get("lang"))
+    return jsonify({"patient": patient, "history": patient_history(conn, patient_id, lang)})
+
+@app.route("/api/analytics")
+@conditional_get(time_window=True)
+def api_analytics():
+    conn = get_conn()
+    ar = (request.args.get("ar") or "30").strip()
+    aa = (request.args.get("aa") or "").strip()
+    analytics = cached_analytics(conn, ar=ar, aa=aa, lang=resolve_lang(request.args.get("lang")))
+    return jsonify({"ar": ar, "aa": aa, "analytics": analytics_json(analytics)})
+
+@app.route("/api/export/screenings")
+def api_export_screenings():
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson."}), 400
+    args = dict(
+        date_from=request.args.get("from"),
+        date_to=request.args.get("to"),
+        assessor=(request.args.get("assessor") or "").strip() or None,
+    )
     try:
-        assessor_rows = conn.execute(
-            "SELECT DISTINCT assessor FROM screenings WHERE assessor IS NOT NULL AND assessor != '' ORDER BY assessor ASC"
-        ).fetchall()
-        assessor_names = [r["assessor"] for r in assessor_rows]
-    except sqlite3.OperationalError:
-        assessor_names = []
+        export_query(**args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    analytics = compute_analytics(conn, ar=ar, aa=aa)
-    conn.close()
+    def generate():
+        # own connection: the response outlives the request-scoped one
+        conn = connect()
+        try:
+            yield from iter_export(conn, fmt, **args)
+        finally:
+            conn.close()
+
+    filename = "screenings-%s.%s" % (datetime.now().strftime("%Y%m%d"), fmt)
+    return app.response_class(
+        generate(),
+        content_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-    return render_template_string(
-        HTML,
-        t=t,
-        lang=lang,
-        lang_choices=LANG_CHOICES,
-        result=result,
-        form=form_data,
-        message=message,
-        patients=patients,
-        selected_patient=selected_patient,
-        history=history,
-        default_age_group=default_age_group,
-        analytics=analytics,
-        assessor_names=assessor_names,
-        ar=ar,
-        aa=aa,
+@app.route("/api/sync", methods=["POST"])
+def api_sync():
+    try:
+        stats = apply_sync_batch(get_conn(), request.get_data())
+    except SyncGapError as e:
+        return jsonify({"error": str(e)}), 409
+    except (ValueError, KeyError, TypeError, zlib.error) as e:
+        return jsonify({"error": f"Invalid sync batch: {e}"}), 400
+    return jsonify(stats)
+
+@app.route("/api/export/jobs", methods=["POST"])
+def api_export_job():
+    data = request.get_json(silent=True) or request.form.to_dict() or request.args.to_dict()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object of export options."}), 400
+    options = {key: data.get(key) or "" for key in ("format", "from", "to", "assessor")}
+    if not all(isinstance(value, str) for value in options.values()):
+        return jsonify({"error": "format, from, to and assessor must be strings."}), 400
+    payload = {
+        "format": (options["format"] or "csv").strip().lower(),
+        "from": options["from"] or None,
+        "to": options["to"] or None,
+        "assessor": options["assessor"].strip() or None,
+    }
+    if payload["format"] not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson."}), 400
+    try:
+        export_query(payload["from"], payload["to"], payload["assessor"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = get_conn()
+    job_id = enqueue_job(conn, "export", payload)
+    conn.commit()
+    notify_jobs(conn)
+    return jsonify({"job_id": job_id, "status_url": url_for("api_job", job_id=job_id)}), 202
+
+@app.route("/api/jobs/<int:job_id>")
+def api_job(job_id):
+    row = get_conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return jsonify({"error": "Job not found."}), 404
+    job = dict(row)
+    job.pop("owner", None)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    if job["kind"] == "export" and job["status"] == "done":
+        job["download_url"] = url_for("api_job_download", job_id=job_id)
+    return jsonify(job)
+
+@app.route("/api/jobs/<int:job_id>/download")
+def api_job_download(job_id):
+    row = get_conn().execute(
+        "SELECT result FROM jobs WHERE id = ? AND kind = 'export' AND status = 'done'", (job_id,)
+    ).fetchone()
+    if row is None:
+        return jsonify({"error": "Export not ready."}), 404
+    result = json.loads(row["result"])
+    return send_file(
+        os.path.abspath(result["path"]), mimetype=EXPORT_FORMATS[result["format"]].split(";")[0],
+        as_attachment=True, download_name=os.path.basename(result["path"]),
     )
 
+@app.route("/metrics")
+def metrics():
+    if not INSTRUMENT:
+        return jsonify({"error": "Instrumentation is off (set TOTO_INSTRUMENT=1)."}), 404
+    return app.response_class(prometheus_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/api/analytics/cache")
+def api_analytics_cache():
+    with _analytics_cache_lock:
+        stats = dict(analytics_cache_stats, size=len(_analytics_cache), max_size=ANALYTICS_CACHE_SIZE)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return jsonify(stats)
+
+@app.route("/api/assessors")
+@conditional_get()
+def api_assessors():
+    return jsonify({"assessors": assessor_names(get_conn())})
+
+# -------------------- CLI --------------------
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute the analytics rollup from the screenings table."""
+    init_db()
+    conn = connect()
+    rebuild_rollups(conn)
+    conn.commit()
+    n = conn.execute("SELECT COUNT(*) FROM analytics_rollup").fetchone()[0]
+    conn.close()
+    print(f"Rebuilt analytics rollup: {n} rows.")
+
+@app.cli.command("migrate-db")
+def migrate_db_command():
+    """Apply pending schema migrations."""
+    conn = connect()
+    before = schema_version(conn)
+    migrate(conn)
+    conn.close()
+    print(f"Schema version {before} -> {SCHEMA_VERSION}.")
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Assert that EXPLAIN QUERY PLAN uses the expected index for each hot query."""
+    init_db()
+    conn = connect()
+    failures = check_query_plans(conn)
+    conn.close()
+    for label, index_name, plan in failures:
+        print(f"FAIL {label}: expected {index_name}, got {plan}")
+    if failures:
+        raise SystemExit(1)
+    print(f"All {len(hot_query_plans())} hot queries use their indexes.")
+
+@app.cli.command("rescore-screenings")
+def rescore_screenings_command():
+    """Re-score stored screenings under the current scoring rules (after editing scoring_rules.json)."""
+    init_db()
+    conn = connect()
+    changed = rescore_screenings(conn)
+    conn.close()
+    print(f"Re-scored screenings; {changed} changed.")
+
+@app.cli.command("check-scoring-rules")
+@click.argument("path", default=SCORING_RULES_PATH)
+def check_scoring_rules_command(path):
+    """Validate a scoring rule table before deploying it."""
+    try:
+        rules = load_scoring_rules(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Invalid rule table {path}: {e}")
+        raise SystemExit(1)
+    print(f"OK: {len(rules['conditions'])} conditions, rule fields: {', '.join(rules['fields'])}.")
+
+@app.cli.command("export-screenings")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv")
+@click.option("--from", "date_from", help="First day (YYYY-MM-DD), inclusive.")
+@click.option("--to", "date_to", help="Last day (YYYY-MM-DD), inclusive.")
+@click.option("--assessor", help="Only screenings by this assessor.")
+@click.option("--output", "-o", default="-", help="Output file (default: stdout).")
+def export_screenings_command(fmt, date_from, date_to, assessor, output):
+    """Stream screenings with patient fields as CSV or NDJSON."""
+    init_db()
+    conn = connect()
+    try:
+        chunks = iter_export(conn, fmt, date_from, date_to, assessor)
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+        else:
+            with open(output, "w", encoding="utf-8", newline="") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    finally:
+        conn.close()
+
+@app.cli.command("merge-db")
+@click.argument("sources", nargs=-1, required=True)
+@click.option("--into", "db_path", default=None, help="Central database (default: DB_PATH).")
+def merge_db_command(sources, db_path):
+    """Pull new patients and screenings from device databases into a central one."""
+    conn = connect(db_path)
+    migrate(conn)
+    failed = 0
+    for path in sources:
+        try:
+            stats = merge_device_db(conn, path)
+        except (ValueError, sqlite3.Error) as e:
+            print(f"SKIP {path}: {e}")
+            failed += 1
+            continue
+        print(f"{path} ({stats['device_id']}): +{stats['patients']} patients, +{stats['screenings']} screenings")
+    conn.close()
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command("run-jobs")
+def run_jobs_command():
+    """Run queued background jobs until the queue is empty."""
+    init_db()
+    conn = connect()
+    done = run_jobs(conn)
+    conn.close()
+    print(f"Ran {done} job(s).")
+
+@app.cli.command("sync-push")
+@click.argument("hub_url")
+def sync_push_command(hub_url):
+    """Send unsynced changes to a hub's /api/sync endpoint, batch by batch."""
+    import urllib.request
+
+    init_db()
+    conn = connect()
+    sent = 0
+    try:
+        while True:
+            built = build_sync_batch(conn)
+            if built is None:
+                break
+            payload, to_seq = built
+            req = urllib.request.Request(
+                hub_url.rstrip("/") + "/api/sync", data=payload,
+                headers={"Content-Type": "application/octet-stream"}, method="POST",
+            )
+            try:
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    json.loads(resp.read())
+            except (OSError, ValueError) as e:
+                raise click.ClickException(f"Sync stopped at seq {to_seq}: {e}")
+            mark_synced(conn, to_seq)
+            sent += len(payload)
+            print(f"Synced up to seq {to_seq} ({len(payload)} bytes).")
+    finally:
+        conn.close()
+    print(f"Up to date; sent {sent} bytes.")
+
+@app.cli.command("sync-export")
+@click.argument("out_file")
+def sync_export_command(out_file):
+    """Write the next unsynced batch to a file (for carrying to the hub by hand)."""
+    init_db()
+    conn = connect()
+    built = build_sync_batch(conn)
+    conn.close()
+    if built is None:
+        print("Nothing to sync.")
+        return
+    payload, to_seq = built
+    with open(out_file, "wb") as f:
+        f.write(payload)
+    print(f"Wrote batch up to seq {to_seq} ({len(payload)} bytes); run 'flask sync-ack {to_seq}' once applied.")
+
+@app.cli.command("sync-ack")
+@click.argument("to_seq", type=int)
+def sync_ack_command(to_seq):
+    """Advance the sync checkpoint after the hub applied a batch."""
+    init_db()
+    conn = connect()
+    mark_synced(conn, to_seq)
+    conn.close()
+    print(f"Sync checkpoint at seq {to_seq}.")
+
+@app.cli.command("sync-apply")
+@click.argument("files", nargs=-1, required=True)
+@click.option("--into", "db_path", default=None, help="Hub database (default: DB_PATH).")
+def sync_apply_command(files, db_path):
+    """Apply sync batch files to this (hub) database."""
+    conn = connect(db_path)
+    migrate(conn)
+    for path in files:
+        with open(path, "rb") as f:
+            try:
+                stats = apply_sync_batch(conn, f.read())
+            except (ValueError, KeyError, TypeError, zlib.error) as e:
+                conn.close()
+                raise click.ClickException(f"{path}: {e}")
+        print(f"{path}: {json.dumps(stats)}")
+    conn.close()
+
+@app.cli.command("export-parquet")
+@click.argument("out_dir")
+@click.option("--db", "db_path", default=None, help="Database to export (default: DB_PATH).")
+@click.option("--source", help="File name for this database's parts (default: database file name).")
+def export_parquet_command(out_dir, db_path, source):
+    """Write screenings as month-partitioned Parquet files."""
+    if arrow_modules() is None:
+        raise click.ClickException("pyarrow is required for Parquet export.")
+    db_path = db_path or DB_PATH
+    source = source or os.path.splitext(os.path.basename(db_path))[0]
+    conn = connect(db_path)
+    migrate(conn)
+    counts = export_parquet(conn, out_dir, source)
+    conn.close()
+    print(f"Wrote {sum(counts.values())} screenings in {len(counts)} month(s) to {out_dir}.")
+
+@app.cli.command("parquet-analytics")
+@click.argument("path")
+@click.option("--ar", default="all", type=click.Choice(["7", "30", "all"]))
+@click.option("--aa", default="", help="Only this assessor.")
+@click.option("--lang", default="en", type=click.Choice(sorted(LANGUAGES)))
+def parquet_analytics_command(path, ar, aa, lang):
+    """Run the dashboard aggregations over a Parquet export directory."""
+    if arrow_modules() is None:
+        raise click.ClickException("pyarrow is required for Parquet analytics.")
+    analytics = parquet_analytics(path, ar, aa.strip(), lang)
+    print(json.dumps(analytics_json(analytics), ensure_ascii=False, indent=2))
+
 if __name__ == "__main__":
     init_db()
     app.run(host="0.0.0.0", port=5000, debug=False)